@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of matrix construction and reduction on generated models.
+
+Run ``python -m beizer.benchmarks --help`` for options. Results are
+printed as a table and can be saved as JSON to compare versions.
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from functools import partial
+
+from .core import reduce_matrix_size
+from .models import FLOAT, TransitionMatrix
+from .sparse import SparseTransitionMatrix
+
+DEFAULT_SIZES = (10, 50, 100, 500, 1000, 5000)
+# Families whose reduction is cubic in size are not run on larger models
+# unless limits are switched off.
+MAX_SIZES = {'dense_random': 300}
+
+# Probabilities are multiples of powers of two, so sums of rows are exactly
+# one in floats.
+
+
+def chain(size, seed=None):
+    """Source, ``size - 2`` intermediate vertices one after another, drain.
+    """
+    order = _chain_order(size)
+    edges = [(row, column, 1.0, float(index % 5 + 1))
+             for (index, (row, column)) in enumerate(zip(order, order[1:]))]
+    return size, edges
+
+
+def chain_with_loops(size, seed=None):
+    """Chain where every intermediate vertex has a loop."""
+    order = _chain_order(size)
+    edges = []
+    for (index, (row, column)) in enumerate(zip(order, order[1:])):
+        if row == 0:
+            edges.append((row, column, 1.0, 1.0))
+        else:
+            edges.append((row, row, 0.25, float(index % 3 + 1)))
+            edges.append((row, column, 0.75, float(index % 5 + 1)))
+    return size, edges
+
+
+def random_dag(size, seed=None):
+    """Acyclic graph where every vertex has up to three successors."""
+    rng = random.Random(seed)
+    order = _chain_order(size)
+    edges = []
+    for (index, row) in enumerate(order[:-1]):
+        targets = [order[index + 1]]
+        for _ in range(2):
+            target = order[rng.randint(index + 1, len(order) - 1)]
+            if target not in targets:
+                targets.append(target)
+        edges.extend(_split(row, targets, rng))
+    return size, edges
+
+
+def dense_random(size, seed=None):
+    """Cyclic graph where every vertex has about a quarter of all vertices
+    as successors.
+    """
+    rng = random.Random(seed)
+    order = _chain_order(size)
+    degree = 1
+    while degree * 2 <= max(1, (size - 1) // 4):
+        degree *= 2
+    edges = []
+    for (index, row) in enumerate(order[:-1]):
+        following = order[index + 1]
+        candidates = [vertex for vertex in range(size)
+                      if vertex not in (0, row, following)]
+        others = rng.sample(candidates, min(degree, len(candidates)))
+        if not others:
+            edges.append((row, following, 1.0, float(rng.randint(1, 9))))
+            continue
+        edges.append((row, following, 0.5, float(rng.randint(1, 9))))
+        for column in others:
+            edges.append((row, column, 0.5 / len(others),
+                          float(rng.randint(1, 9))))
+    return size, edges
+
+
+def grid_cfg(size, seed=None):
+    """Control flow graph shaped as a square grid, every cell branches right
+    or down. Size is rounded down to a square plus source and drain.
+    """
+    width = max(1, int((size - 2) ** 0.5))
+
+    def vertex(row, column):
+        return 2 + row * width + column
+
+    edges = [(0, vertex(0, 0), 1.0, 1.0)]
+    for row in range(width):
+        for column in range(width):
+            targets = []
+            if column + 1 < width:
+                targets.append(vertex(row, column + 1))
+            if row + 1 < width:
+                targets.append(vertex(row + 1, column))
+            if not targets:
+                targets.append(1)
+            share = 1.0 / len(targets)
+            for target in targets:
+                edges.append((vertex(row, column), target, share,
+                              float((row + column) % 7 + 1)))
+    return width * width + 2, edges
+
+
+def nested_loops(size, seed=None, depth=3):
+    """Chain with ``depth`` levels of nested loops returning to the start of
+    their block.
+    """
+    order = _chain_order(size)
+    inner = len(order) - 2
+    blocks = [max(2, inner // (2 ** level)) for level in range(1, depth + 1)]
+    edges = [(0, order[1], 1.0, 1.0)]
+    for index in range(1, len(order) - 1):
+        row = order[index]
+        position = index - 1
+        back = None
+        for block in reversed(blocks):
+            if position % block == block - 1:
+                back = order[index - block + 1]
+                break
+        if back is None:
+            edges.append((row, order[index + 1], 1.0, 2.0))
+        else:
+            edges.append((row, back, 0.25, 3.0))
+            edges.append((row, order[index + 1], 0.75, 2.0))
+    return size, edges
+
+
+FAMILIES = {
+    'chain': chain,
+    'chain_with_loops': chain_with_loops,
+    'random_dag': random_dag,
+    'dense_random': dense_random,
+    'grid_cfg': grid_cfg,
+    'nested_loops': nested_loops,
+}
+
+
+def _chain_order(size):
+    if size < 3:
+        raise ValueError('model needs at least three vertices')
+    return [0] + list(range(2, size)) + [1]
+
+
+def _split(row, targets, rng):
+    shares = {1: [1.0], 2: [0.5, 0.5], 3: [0.5, 0.25, 0.25]}[len(targets)]
+    return [(row, target, share, float(rng.randint(1, 9)))
+            for (target, share) in zip(targets, shares)]
+
+
+def _src_matrix(size, edges):
+    src_matrix = [[None] * size for _ in range(size)]
+    for (row, column, probability, resource) in edges:
+        src_matrix[row][column] = (probability, resource)
+    return src_matrix
+
+
+def _builders(backend):
+    """Returns functions preparing input of the backend and building it."""
+    if backend == 'sparse':
+        return (lambda size, edges: (size, edges),
+                lambda src: SparseTransitionMatrix.from_edges(
+                    *src, numeric=FLOAT))
+    if backend == 'list':
+        return _src_matrix, partial(TransitionMatrix, numeric=FLOAT)
+    if backend == 'dense':
+        from .dense import DenseTransitionMatrix
+        return _src_matrix, DenseTransitionMatrix
+    raise ValueError('unknown backend {0!r}'.format(backend))
+
+
+def run_benchmark(family, size, backend='sparse', order=None, seed=0,
+                  memory=True):
+    """Returns record with timings of one model.
+
+    Construction and reduction are timed separately. Peak memory of the
+    reduction is measured in a second run because tracing slows it down.
+    """
+    (size, edges) = FAMILIES[family](size, seed)
+    (prepare, build) = _builders(backend)
+
+    src = prepare(size, edges)
+    gc.collect()
+    started = time.perf_counter()
+    transition_matrix = build(src)
+    construct_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    created = reduce_matrix_size(transition_matrix, order)
+    reduce_seconds = time.perf_counter() - started
+
+    peak_memory = None
+    if memory:
+        transition_matrix = build(src)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            reduce_matrix_size(transition_matrix, order)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    result = transition_matrix.transition(0, 1)
+    return {
+        'family': family,
+        'size': size,
+        'backend': backend,
+        'order': order,
+        'edges': len(edges),
+        'construct_seconds': construct_seconds,
+        'reduce_seconds': reduce_seconds,
+        'peak_memory_bytes': peak_memory,
+        'transitions_created': created,
+        'probability': None if result is None else float(result.probability),
+        'resource': None if result is None else float(result.resource),
+    }
+
+
+def run_benchmarks(families=None, sizes=DEFAULT_SIZES, backends=('sparse',),
+                   order=None, seed=0, memory=True, limit=True):
+    """Returns records of all combinations of families, sizes and backends.
+    """
+    records = []
+    for family in families or sorted(FAMILIES):
+        for size in sizes:
+            if limit and size > MAX_SIZES.get(family, size):
+                continue
+            for backend in backends:
+                records.append(run_benchmark(family, size, backend, order,
+                                             seed, memory))
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark construction and reduction of generated '
+                    'models.')
+    parser.add_argument('--families', default=','.join(sorted(FAMILIES)),
+                        help='comma separated families of models')
+    parser.add_argument('--sizes',
+                        default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='comma separated numbers of vertices')
+    parser.add_argument('--backends', default='sparse',
+                        help='comma separated list of sparse, list, dense')
+    parser.add_argument('--order', default=None,
+                        help='elimination order strategy')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true',
+                        help='do not measure peak memory')
+    parser.add_argument('--no-limit', action='store_true',
+                        help='run dense families on all sizes')
+    parser.add_argument('--json', metavar='PATH',
+                        help='save results as JSON, "-" for stdout')
+    args = parser.parse_args(argv)
+
+    records = run_benchmarks(
+        families=args.families.split(','),
+        sizes=[int(size) for size in args.sizes.split(',')],
+        backends=args.backends.split(','),
+        order=args.order, seed=args.seed, memory=not args.no_memory,
+        limit=not args.no_limit)
+
+    if args.json:
+        document = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': records,
+        }
+        if args.json == '-':
+            json.dump(document, sys.stdout, indent=2)
+            sys.stdout.write('\n')
+            return
+        with open(args.json, 'w') as json_file:
+            json.dump(document, json_file, indent=2)
+
+    row_format = '{0:<18} {1:>6} {2:<7} {3:>8} {4:>11} {5:>11} {6:>10} {7:>9}'
+    print(row_format.format('family', 'size', 'backend', 'edges',
+                            'construct,s', 'reduce,s', 'peak,KiB',
+                            'created'))
+    for record in records:
+        peak = record['peak_memory_bytes']
+        print(row_format.format(
+            record['family'], record['size'], record['backend'],
+            record['edges'], '{0:.4f}'.format(record['construct_seconds']),
+            '{0:.4f}'.format(record['reduce_seconds']),
+            '-' if peak is None else peak // 1024,
+            record['transitions_created']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+
+from .core import reduce_matrix_size
+from .models import EXACT, Transition
+from .sparse import SparseTransitionMatrix
+
+CacheStatistics = namedtuple('CacheStatistics',
+                             'hits misses evictions entries size_bytes')
+
+
+def matrix_key(transition_matrix, order=None):
+    """Returns SHA-256 hex digest of matrix contents and elimination order.
+
+    Numbers are hashed with their types, so matrices of Decimal and float
+    numbers have different keys.
+    """
+    digest = hashlib.sha256()
+    digest.update('{0!r};{1!r};{2!r}\n'.format(
+        len(transition_matrix),
+        getattr(transition_matrix, 'numeric', EXACT),
+        order if order is None or isinstance(order, str) else tuple(order),
+    ).encode('utf-8'))
+    for (row, column, trans) in transition_matrix.iter_transitions():
+        digest.update('{0},{1},{2}:{3!r},{4}:{5!r}\n'.format(
+            row, column,
+            type(trans.probability).__name__, trans.probability,
+            type(trans.resource).__name__, trans.resource,
+        ).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ReductionCache(object):
+    """LRU cache of transitions from source to drain keyed by contents of
+    matrices.
+
+    The cache can be shared by threads. Matrices with the same key may be
+    reduced concurrently on a miss, the last result is kept.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=None):
+        """Initializes cache.
+
+        Keyword arguments:
+        max_entries -- number of results kept.
+        max_bytes -- approximate memory limit of keys and results.
+
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def reduce(self, transition_matrix, order=None):
+        """Returns transition from source to drain.
+
+        A copy of the matrix is reduced by ``reduce_matrix_size`` only on a
+        miss, the matrix is not changed either way. Returned transition is
+        a copy which can be changed by caller.
+        """
+        key = matrix_key(transition_matrix, order)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+            else:
+                self._misses += 1
+        if entry is not None:
+            return _copy(entry[0])
+
+        reduced_matrix = SparseTransitionMatrix.from_edges(
+            len(transition_matrix),
+            [(row, column, trans.probability, trans.resource)
+             for (row, column, trans)
+             in transition_matrix.iter_transitions()],
+            getattr(transition_matrix, 'numeric', EXACT), check_rows=False)
+        reduce_matrix_size(reduced_matrix, order)
+        trans = _copy(reduced_matrix.transition(0, 1))
+        self._put(key, trans)
+        return _copy(trans)
+
+    def statistics(self):
+        """Returns ``CacheStatistics``."""
+        with self._lock:
+            return CacheStatistics(self._hits, self._misses,
+                                   self._evictions, len(self._entries),
+                                   self._size_bytes)
+
+    def clear(self):
+        """Removes all results, statistics are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def _put(self, key, trans):
+        size_bytes = _size_of(key, trans)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size_bytes -= previous[1]
+            self._entries[key] = (trans, size_bytes)
+            self._size_bytes += size_bytes
+            while self._entries and (
+                    len(self._entries) > self.max_entries or
+                    (self.max_bytes is not None and
+                     self._size_bytes > self.max_bytes)):
+                (_, (_, evicted_bytes)) = self._entries.popitem(last=False)
+                self._size_bytes -= evicted_bytes
+                self._evictions += 1
+
+
+def _copy(trans):
+    if trans is None:
+        return None
+    return Transition(trans.probability, trans.resource)
+
+
+def _size_of(key, trans):
+    size_bytes = sys.getsizeof(key)
+    if trans is not None:
+        size_bytes += (sys.getsizeof(trans) +
+                       sys.getsizeof(trans.probability) +
+                       sys.getsizeof(trans.resource))
+    return size_bytes
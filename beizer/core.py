@@ -1,9 +1,167 @@
 # -*- coding: utf-8 -*-
+from bisect import bisect_left
+from functools import partial
+from multiprocessing import Pool
+from time import perf_counter
 
+from .exceptions import BeizerException, MatrixInitError, MatrixReduceError
+from .models import (EXACT, FLOAT, DEFAULT_TOLERANCE, extract_transition,
+                     to_float)
+from .observers import LOOP, VERTEX, ReductionEvent
+from .ordering import elimination_order
+from .sparse import SparseTransitionMatrix
+from .utils import matrix_is_quadratic
 
-def reduce_matrix_size(transition_matrix):
-    """Reduces matrix size."""
-    while not transition_matrix.has_only_source_and_drain():
-        while transition_matrix.loop_exists():
+
+def reduce_matrix_size(transition_matrix, order=None, observer=None,
+                       numeric=None):
+    """Reduces matrix size.
+
+    Vertices are excluded starting from the last one unless ``order`` is
+    given. It is either a strategy from ``beizer.ordering`` or a sequence of
+    vertex indices, source and drain are kept in any case.
+
+    ``observer`` is called with ``ReductionEvent`` after every loop and
+    vertex exclusion, ``ReductionStatistics`` summarizes them. Events are
+    neither built nor timed without observer.
+
+    ``numeric`` switches the matrix to ``FLOAT`` mode before reduction,
+    transitions are converted in place. By default the matrix is reduced in
+    the mode it was built with.
+
+    Returns number of transitions created while excluding vertices.
+    """
+    _set_numeric(transition_matrix, numeric)
+    return _reduce(transition_matrix, order, (0, 1), observer)
+
+
+def reduce_to_vertices(transition_matrix, keep, order=None, observer=None):
+    """Reduces matrix to the kept vertices excluding every other one once.
+
+    Kept vertices, e.g. an entry and several exits, stay in the matrix in
+    their original order and loops on them are excluded. ``order`` and
+    ``observer`` have the same meaning as in ``reduce_matrix_size``, a
+    sequence ``order`` lists every vertex except kept ones.
+
+    Returns dict which maps ``(row, column)`` pairs of original indices of
+    kept vertices to transitions between them.
+    """
+    keep = sorted(set(keep))
+    size = len(transition_matrix)
+    if not keep or keep[0] < 0 or keep[-1] >= size:
+        raise MatrixReduceError('kept vertices have to be in the matrix',
+                                keep)
+    _reduce(transition_matrix, order, keep, observer)
+    return dict(((keep[row], keep[column]), trans) for (row, column, trans)
+                in transition_matrix.iter_transitions())
+
+
+def _reduce(transition_matrix, order, keep, observer):
+    created = 0
+    vertices = list(range(len(transition_matrix)))
+    for vertex in elimination_order(transition_matrix, order, keep):
+        _exclude_loops(transition_matrix, vertices, observer)
+        index = bisect_left(vertices, vertex)
+        del vertices[index]
+        if observer is None:
+            created += transition_matrix.exclude_vertex(index).created
+            continue
+        started = perf_counter()
+        exclusion = transition_matrix.exclude_vertex(index)
+        observer(ReductionEvent(VERTEX, vertex, exclusion.touched,
+                                exclusion.created, perf_counter() - started))
+        created += exclusion.created
+    _exclude_loops(transition_matrix, vertices, observer)
+    return created
+
+
+def _set_numeric(transition_matrix, numeric):
+    current = getattr(transition_matrix, 'numeric', EXACT)
+    if numeric is None or numeric == current:
+        return
+    if numeric != FLOAT:
+        raise MatrixReduceError(
+            'matrix in {0} mode can not be reduced in {1} mode'.format(
+                current, numeric))
+    for (_, _, trans) in transition_matrix.iter_transitions():
+        to_float(trans)
+    transition_matrix.numeric = FLOAT
+
+
+def _exclude_loops(transition_matrix, vertices, observer):
+    while transition_matrix.loop_exists():
+        if observer is None:
             transition_matrix.exclude_first_loop()
-        transition_matrix.exclude_last_vertex()
+            continue
+        started = perf_counter()
+        exclusion = transition_matrix.exclude_first_loop()
+        observer(ReductionEvent(LOOP, vertices[exclusion.vertex],
+                                exclusion.touched, exclusion.created,
+                                perf_counter() - started))
+
+
+def reduce_many(models, processes=None, chunksize=1, order=None,
+                numeric=FLOAT, tolerance=DEFAULT_TOLERANCE):
+    """Reduces independent models in a pool of processes.
+
+    Keyword arguments:
+    models -- source matrices or transition matrices.
+    processes -- number of worker processes, number of CPUs by default.
+    chunksize -- number of models sent to a worker at once.
+    order -- elimination order accepted by ``reduce_matrix_size``.
+    numeric -- ``FLOAT`` (default) or ``EXACT`` mode of workers' matrices.
+    tolerance -- tolerance of sums of probabilities in float mode.
+
+    Models are sent to workers as ``(size, edges)`` tuples. Returns a list
+    in the order of models, every item is a transition from source to drain
+    or an exception of ``beizer`` module raised by that model.
+    """
+    compact_models = [_compact_model(model) for model in models]
+    pool = Pool(processes)
+    try:
+        reduce_model = partial(_reduce_compact_model, order=order,
+                               numeric=numeric, tolerance=tolerance)
+        return list(pool.imap(reduce_model, compact_models, chunksize))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _compact_model(model):
+    """Returns ``(size, edges)`` of a model or error of malformed model."""
+    if isinstance(model, list):
+        if not matrix_is_quadratic(model):
+            return MatrixInitError('matrix has to be quadratic')
+        cells = ((row, column, extract_transition(cell))
+                 for (row, row_src) in enumerate(model)
+                 for (column, cell) in enumerate(row_src))
+    elif hasattr(model, 'iter_transitions'):
+        cells = model.iter_transitions()
+    else:
+        return MatrixInitError('expected a list object')
+    try:
+        edges = tuple((row, column, trans.probability, trans.resource)
+                      for (row, column, trans) in cells if trans is not None)
+    except ValueError as exc:
+        # E.g. a cell of three items.
+        return MatrixInitError('transition is malformed', str(exc))
+    return len(model), edges
+
+
+def _reduce_compact_model(compact_model, order=None, numeric=EXACT,
+                          tolerance=DEFAULT_TOLERANCE):
+    if isinstance(compact_model, BeizerException):
+        return compact_model
+    try:
+        transition_matrix = SparseTransitionMatrix.from_edges(
+            *compact_model, numeric=numeric, tolerance=tolerance)
+    except BeizerException as exc:
+        return exc
+    except (ValueError, TypeError) as exc:
+        # E.g. a probability which is not a number.
+        return MatrixInitError('transition is malformed', str(exc))
+    try:
+        reduce_matrix_size(transition_matrix, order)
+    except BeizerException as exc:
+        return exc
+    return transition_matrix.transition(0, 1)
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+from bisect import bisect_left
+
+import numpy as np
+
+from .exceptions import LoopExcludeError
+from .models import (FLOAT, DEFAULT_TOLERANCE, Exclusion, Transition,
+                     iter_transition_rows)
+from .ordering import Pattern, elimination_order
+
+
+class DenseTransitionMatrix(object):
+    """Transition matrix stored in NumPy arrays.
+
+    Probabilities and resources are kept in two float64 planes, occupancy
+    mask tells which cells hold a transition. The matrix has the same
+    interface as ``TransitionMatrix`` so ``reduce_matrix_size`` works on it.
+    """
+
+    numeric = FLOAT
+
+    def __init__(self, src_matrix, numeric=FLOAT,
+                 tolerance=DEFAULT_TOLERANCE):
+        """Initializes transition matrix.
+
+        Numbers are always stored as float64, ``numeric`` only selects
+        whether sums of probabilities are checked exactly or with
+        ``tolerance``.
+        """
+        rows = list(iter_transition_rows(src_matrix, numeric, tolerance))
+        size = len(rows)
+        self._probability = np.zeros((size, size))
+        self._resource = np.zeros((size, size))
+        self._occupancy = np.zeros((size, size), dtype=bool)
+        for (row, row_of_transitions) in enumerate(rows):
+            for (column, trans) in enumerate(row_of_transitions):
+                if trans is not None:
+                    self._probability[row, column] = trans.probability
+                    self._resource[row, column] = trans.resource
+                    self._occupancy[row, column] = True
+
+    @classmethod
+    def from_arrays(cls, probability, resource, occupancy):
+        """Returns matrix which uses given planes as its storage.
+
+        Planes are not copied and not validated, they are changed in place
+        by exclusions.
+        """
+        matrix = cls.__new__(cls)
+        matrix._probability = probability
+        matrix._resource = resource
+        matrix._occupancy = occupancy
+        return matrix
+
+    def __repr__(self):
+        size = len(self)
+        return repr([[self.transition(row, column) for column in range(size)]
+                     for row in range(size)])
+
+    def __len__(self):
+        return self._occupancy.shape[0]
+
+    def transition(self, row, column):
+        """Returns transition from ``row`` vertex to ``column`` vertex."""
+        if not self._occupancy[row, column]:
+            return None
+        return Transition(probability=float(self._probability[row, column]),
+                          resource=float(self._resource[row, column]))
+
+    def has_only_source_and_drain(self):
+        """Returns True if matrix has got only source and drain."""
+        return len(self) == 2 and not self.loop_exists()
+
+    def loop_exists(self):
+        """Returns True if loop exists in transition matrix."""
+        return self._index_of_first_loop() is not None
+
+    def exclude_first_loop(self):
+        """Excludes loop from transition matrix.
+
+        Returns ``Exclusion`` of the loop.
+        """
+        index = self._index_of_first_loop()
+        if index is None:
+            raise LoopExcludeError('loop does not found')
+        touched = exclude_loop(self._probability, self._resource,
+                               self._occupancy, index)
+        return Exclusion(index, touched, 0)
+
+    def exclude_last_vertex(self):
+        """Excludes last vertex from transition matrix.
+
+        Returns ``Exclusion`` of the vertex.
+        """
+        return self.exclude_vertex(len(self) - 1)
+
+    def exclude_vertex(self, index):
+        """Excludes ``index`` vertex from transition matrix.
+
+        Returns ``Exclusion`` of the vertex.
+        """
+        (self._probability, self._resource, self._occupancy,
+         exclusion) = exclude_vertex(self._probability, self._resource,
+                                     self._occupancy, index)
+        return exclusion
+
+    def remove_vertex(self, index):
+        """Removes ``index`` vertex with its transitions, paths through the
+        vertex are lost.
+        """
+        self._probability = _delete_vertex(self._probability, index)
+        self._resource = _delete_vertex(self._resource, index)
+        self._occupancy = _delete_vertex(self._occupancy, index)
+
+    def iter_transitions(self):
+        """Yields ``(row, column, transition)`` of non-empty cells."""
+        for (row, column) in zip(*np.nonzero(self._occupancy)):
+            yield int(row), int(column), self.transition(row, column)
+
+    def _index_of_first_loop(self):
+        """Returns index of first loop in transition matrix."""
+        loops = np.flatnonzero(np.diagonal(self._occupancy))
+        if loops.size:
+            return int(loops[0])
+
+
+def reduce_batch(probability, resource, occupancy=None, order=None):
+    """Reduces a batch of matrices which share topology.
+
+    Keyword arguments:
+    probability -- array of probabilities with shape (batch, n, n).
+    resource -- array of resources with the same shape.
+    occupancy -- (n, n) mask of non-empty cells, by default a cell is
+    non-empty if its probability is not zero in any matrix of the batch.
+    order -- elimination order accepted by ``reduce_matrix_size``.
+
+    Loops and vertices are excluded the same way as ``reduce_matrix_size``
+    does, but for the whole batch at once. Returns arrays of probabilities
+    and resources of transition from source to drain, probability is zero
+    and resource is NaN where there is no such transition.
+    """
+    probability = np.array(probability, dtype=np.float64)
+    resource = np.array(resource, dtype=np.float64)
+    if probability.ndim != 3 or probability.shape != resource.shape:
+        raise ValueError('expected two arrays with shape (batch, n, n)')
+    if occupancy is None:
+        occupancy = (probability != 0).any(axis=0)
+    else:
+        occupancy = np.array(occupancy, dtype=bool)
+
+    rows, columns = np.nonzero(occupancy)
+    pattern = Pattern(occupancy.shape[0], list(zip(rows, columns)))
+    vertices = list(range(occupancy.shape[0]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for vertex in elimination_order(pattern, order):
+            _exclude_loops(probability, resource, occupancy)
+            index = bisect_left(vertices, vertex)
+            del vertices[index]
+            (probability, resource, occupancy, _) = exclude_vertex(
+                probability, resource, occupancy, index)
+        _exclude_loops(probability, resource, occupancy)
+
+    if occupancy[0, 1]:
+        return probability[:, 0, 1].copy(), resource[:, 0, 1].copy()
+    return (np.zeros(probability.shape[0]),
+            np.full(probability.shape[0], np.nan))
+
+
+def _exclude_loops(probability, resource, occupancy):
+    for index in np.flatnonzero(np.diagonal(occupancy)):
+        exclude_loop(probability, resource, occupancy, index)
+
+
+def exclude_loop(probability, resource, occupancy, index):
+    """Excludes loop of ``index`` vertex in place.
+
+    Probability and resource planes may have leading batch dimensions, the
+    occupancy mask is shared by the whole batch. Cells of the loop row are
+    scaled the same way as ``transform_trans_while_excluding_loop`` does.
+    Returns number of scaled cells of the row.
+    """
+    loop_probability = probability[..., index, index].copy()
+    loop_resource = resource[..., index, index].copy()
+    occupancy[index, index] = False
+    probability[..., index, index] = 0
+    resource[..., index, index] = 0
+
+    columns = np.flatnonzero(occupancy[index])
+    if columns.size:
+        denominator = 1 - loop_probability
+        probability[..., index, columns] /= denominator[..., None]
+        resource[..., index, columns] += (
+            (loop_resource * loop_probability) / denominator
+        )[..., None]
+    return columns.size
+
+
+def exclude_vertex(probability, resource, occupancy, index):
+    """Excludes ``index`` vertex and returns the smaller planes together with
+    ``Exclusion`` of the vertex.
+
+    The exclusion is a rank-1 update: outer product of the vertex column and
+    the vertex row is merged into host cells the same way as
+    ``transform_trans_while_excluding_vertex`` does. When the last vertex is
+    excluded the returned planes are views of the given ones.
+    """
+    rows = np.flatnonzero(occupancy[:, index])
+    rows = rows[rows != index]
+    columns = np.flatnonzero(occupancy[index])
+    columns = columns[columns != index]
+    created = 0
+    if rows.size and columns.size:
+        cells = (Ellipsis, rows[:, None], columns[None, :])
+        column_probability = probability[..., rows, index][..., :, None]
+        column_resource = resource[..., rows, index][..., :, None]
+        row_probability = probability[..., index, columns][..., None, :]
+        row_resource = resource[..., index, columns][..., None, :]
+        host_probability = probability[cells]
+        host_resource = resource[cells]
+
+        product = column_probability * row_probability
+        new_probability = product + host_probability
+        # A cell of the shared mask may have zero probability in some
+        # matrices of a batch, its resource is kept there instead of 0/0.
+        resource[cells] = np.divide(
+            host_probability * host_resource
+            + product * (column_resource + row_resource),
+            new_probability, out=host_resource.copy(),
+            where=new_probability != 0)
+        probability[cells] = new_probability
+        created = rows.size * columns.size - int(occupancy[cells[1:]].sum())
+        occupancy[cells[1:]] = True
+
+    exclusion = Exclusion(index, rows.size * columns.size, created)
+    last = occupancy.shape[0] - 1
+    if index == last:
+        return (probability[..., :last, :last], resource[..., :last, :last],
+                occupancy[:last, :last], exclusion)
+    return (_delete_vertex(probability, index),
+            _delete_vertex(resource, index),
+            _delete_vertex(occupancy, index), exclusion)
+
+
+def _delete_vertex(plane, index):
+    return np.delete(np.delete(plane, index, axis=-1), index, axis=-2)
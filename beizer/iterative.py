@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+
+from .exceptions import MatrixReduceError
+from .models import Transition
+from .utils import DRAIN, SOURCE, distance_order
+
+# Transition is from source to drain or None. Reach holds probabilities of
+# reaching drain from every vertex and weighted_resource holds resources
+# spent on the way multiplied by those probabilities, they can be passed
+# back as ``initial`` solution. Residual is the largest difference of the
+# two sides of equations of ``h`` and ``g`` at the solution, relative for
+# ``g``. Converged is False if iteration stopped at ``max_iterations``.
+Solution = namedtuple(
+    'Solution',
+    'transition iterations residual converged reach weighted_resource')
+
+
+def solve_iteratively(transition_matrix, tolerance=1e-10,
+                      max_iterations=10000, initial=None):
+    """Returns ``Solution`` found by Gauss-Seidel iteration.
+
+    Probability ``h`` of reaching drain and resource ``g`` spent on the way
+    weighted by that probability satisfy
+
+        h[v] = sum(p * h[w]),  g[v] = sum(p * (r * h[w] + g[w])),
+
+    ``h`` is iterated first and ``g`` with converged ``h`` then. Vertices
+    are swept in order of distance to drain, loops are divided out. Memory
+    is O(E) since no transitions are created.
+
+    Keyword arguments:
+    transition_matrix -- matrix of any backend, it is not changed.
+    tolerance -- error of probabilities and relative error of resources
+    at which iteration stops, the error is estimated from changes of the
+    last sweeps.
+    max_iterations -- largest number of sweeps of each of ``h`` and ``g``.
+    initial -- ``Solution`` of a matrix of the same size to start from,
+    e.g. before a few transitions were changed.
+
+    """
+    size = len(transition_matrix)
+    successors = [[] for _ in range(size)]
+    loop_probability = [0.0] * size
+    loop_weight = [0.0] * size
+    for (row, column, trans) in transition_matrix.iter_transitions():
+        if row == DRAIN:
+            continue
+        probability = float(trans.probability)
+        weight = probability * float(trans.resource)
+        if row == column:
+            loop_probability[row] = probability
+            loop_weight[row] = weight
+        else:
+            successors[row].append((column, probability, weight))
+
+    predecessors = [[] for _ in range(size)]
+    for (row, row_successors) in enumerate(successors):
+        # Vertex which never leaves its loop does not reach drain.
+        if loop_probability[row] < 1:
+            for (column, _, _) in row_successors:
+                predecessors[column].append(row)
+    order = distance_order(predecessors)
+
+    if initial is None:
+        reach = [0.0] * size
+        weighted_resource = [0.0] * size
+    else:
+        if len(initial.reach) != size:
+            raise MatrixReduceError('initial solution has another size',
+                                    len(initial.reach))
+        reach = [0.0] * size
+        weighted_resource = [0.0] * size
+        for vertex in order:
+            reach[vertex] = initial.reach[vertex]
+            weighted_resource[vertex] = initial.weighted_resource[vertex]
+    reach[DRAIN] = 1.0
+    weighted_resource[DRAIN] = 0.0
+
+    def sweep_reach():
+        change = 0.0
+        for vertex in order:
+            value = sum(probability * reach[column]
+                        for (column, probability, _) in successors[vertex])
+            value /= 1 - loop_probability[vertex]
+            change = max(change, abs(value - reach[vertex]))
+            reach[vertex] = value
+        return change
+
+    def sweep_weighted_resource():
+        change = 0.0
+        for vertex in order:
+            value = loop_weight[vertex] * reach[vertex]
+            for (column, probability, weight) in successors[vertex]:
+                value += (weight * reach[column] +
+                          probability * weighted_resource[column])
+            value /= 1 - loop_probability[vertex]
+            change = max(change, abs(value - weighted_resource[vertex]) /
+                         max(1.0, abs(value)))
+            weighted_resource[vertex] = value
+        return change
+
+    def residual_of_equations():
+        residual = 0.0
+        for vertex in order:
+            value = loop_probability[vertex] * reach[vertex]
+            weighted_value = (loop_weight[vertex] * reach[vertex] +
+                              loop_probability[vertex] *
+                              weighted_resource[vertex])
+            for (column, probability, weight) in successors[vertex]:
+                value += probability * reach[column]
+                weighted_value += (weight * reach[column] +
+                                   probability * weighted_resource[column])
+            residual = max(
+                residual, abs(value - reach[vertex]),
+                abs(weighted_value - weighted_resource[vertex]) /
+                max(1.0, abs(weighted_resource[vertex])))
+        return residual
+
+    (reach_iterations, reach_converged) = _iterate(
+        sweep_reach, tolerance, max_iterations)
+    (resource_iterations, resource_converged) = _iterate(
+        sweep_weighted_resource, tolerance, max_iterations)
+
+    trans = None
+    if reach[SOURCE]:
+        trans = Transition(probability=reach[SOURCE],
+                           resource=weighted_resource[SOURCE] / reach[SOURCE])
+    return Solution(trans, reach_iterations + resource_iterations,
+                    residual_of_equations(),
+                    reach_converged and resource_converged,
+                    reach, weighted_resource)
+
+
+def _iterate(sweep, tolerance, max_iterations):
+    """Repeats sweeps until estimated error is within tolerance.
+
+    Change of a sweep underestimates error when iteration converges
+    slowly, so the change is scaled by ``rate / (1 - rate)`` where rate is
+    the ratio of the last two changes. Returns number of sweeps and whether
+    the estimate got within tolerance.
+    """
+    previous = None
+    for iteration in range(1, max_iterations + 1):
+        change = sweep()
+        if change == 0:
+            return iteration, True
+        if previous:
+            rate = change / previous
+            if rate < 1 and change * rate / (1 - rate) <= tolerance:
+                return iteration, True
+        previous = change
+    return max_iterations, False
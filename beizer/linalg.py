@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+try:
+    from scipy import sparse as sp
+    from scipy.sparse import linalg as sp_linalg
+except ImportError:
+    sp = None
+
+from .exceptions import MatrixReduceError
+from .models import Transition
+from .utils import DRAIN, SOURCE, distance_order
+
+
+def solve_source_to_drain(transition_matrix, sparse=None):
+    """Returns transition from source to drain found by linear solve.
+
+    The matrix is treated as an absorbing chain where drain is the
+    absorbing vertex. Probability ``h`` of reaching drain and resource
+    ``g`` spent on the way weighted by that probability satisfy
+
+        (I - Q) h = b,  (I - Q) g = c,
+
+    where ``Q`` holds transitions between the other vertices, ``b`` is the
+    column of transitions to drain and ``c[i]`` is sum of
+    ``P[i][j] * R[i][j] * h[j]``. Resource of the result is ``g / h`` of
+    source, the same expectation ``reduce_matrix_size`` gives. Vertices
+    from which drain is not reachable are left out of the system.
+
+    Keyword arguments:
+    transition_matrix -- matrix of any backend, it is not changed.
+    sparse -- use SciPy sparse LU. By default it is used when SciPy is
+    installed, otherwise the dense LAPACK solver is used.
+
+    """
+    if sparse is None:
+        sparse = sp is not None
+    elif sparse and sp is None:
+        raise ImportError('scipy is required for sparse solver')
+
+    size = len(transition_matrix)
+    rows = []
+    columns = []
+    probabilities = []
+    resources = []
+    predecessors = [[] for _ in range(size)]
+    for (row, column, trans) in transition_matrix.iter_transitions():
+        if row != DRAIN:
+            rows.append(row)
+            columns.append(column)
+            probabilities.append(float(trans.probability))
+            resources.append(float(trans.resource))
+            predecessors[column].append(row)
+
+    # Only vertices which reach drain are unknowns, ``h`` and ``g`` of the
+    # rest are zero. Otherwise a closed cycle makes the system singular.
+    reaching = np.zeros(size, dtype=bool)
+    reaching[distance_order(predecessors)] = True
+    if not reaching[SOURCE]:
+        return None
+    count = int(reaching.sum())
+    # Unknowns keep relative order of their vertices.
+    unknown = np.cumsum(reaching) - 1
+
+    rows = np.array(rows, dtype=np.intp)
+    columns = np.array(columns, dtype=np.intp)
+    probabilities = np.array(probabilities)
+    resources = np.array(resources)
+    kept = reaching[rows] & (reaching[columns] | (columns == DRAIN))
+    rows = unknown[rows[kept]]
+    columns = columns[kept]
+    probabilities = probabilities[kept]
+    resources = resources[kept]
+
+    to_drain = columns == DRAIN
+    inner = ~to_drain
+    b = np.bincount(rows[to_drain], weights=probabilities[to_drain],
+                    minlength=count)
+    q_rows = rows[inner]
+    q_columns = unknown[columns[inner]]
+    q_values = probabilities[inner]
+
+    solve = _factorize(count, q_rows, q_columns, q_values, sparse)
+    h = solve(b)
+    h_of_columns = np.where(to_drain, 1.0,
+                            h[unknown[np.where(to_drain, 0, columns)]])
+    c = np.bincount(rows, weights=probabilities * resources * h_of_columns,
+                    minlength=count)
+    g = solve(c)
+
+    probability = h[unknown[SOURCE]]
+    if probability == 0:
+        return None
+    return Transition(probability=float(probability),
+                      resource=float(g[unknown[SOURCE]] / probability))
+
+
+def _factorize(count, rows, columns, values, sparse):
+    """Returns function solving ``(I - Q) x = rhs``."""
+    if sparse:
+        q = sp.csc_matrix((values, (rows, columns)), shape=(count, count))
+        a = (sp.identity(count, format='csc') - q).tocsc()
+        try:
+            lu = sp_linalg.splu(a)
+        except RuntimeError as exc:
+            raise MatrixReduceError('system of absorbing chain is singular',
+                                    exc)
+        return lu.solve
+
+    a = np.identity(count)
+    np.subtract.at(a, (rows, columns), values)
+
+    def solve(rhs):
+        try:
+            return np.linalg.solve(a, rhs)
+        except np.linalg.LinAlgError as exc:
+            raise MatrixReduceError('system of absorbing chain is singular',
+                                    exc)
+    return solve
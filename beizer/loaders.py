@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from .exceptions import MatrixInitError
+from .models import (EXACT, FLOAT, DEFAULT_TOLERANCE, Transition,
+                     check_sum_of_probabilities)
+from .sparse import SparseTransitionMatrix
+
+CSV = 'csv'
+JSON_LINES = 'jsonl'
+
+
+def load_edges(file_or_path, format=None, size=None, numeric=FLOAT,
+               tolerance=DEFAULT_TOLERANCE):
+    """Returns sparse transition matrix streamed from an edge list.
+
+    Keyword arguments:
+    file_or_path -- path or text file with ``src,dst,probability,resource``
+    edges. CSV may start with a header. JSON lines hold either objects with
+    ``src``, ``dst``, ``probability`` and ``resource`` keys or arrays.
+    format -- ``CSV`` or ``JSON_LINES``, guessed from file name by default.
+    size -- number of vertices, largest vertex index defines it by default.
+    numeric -- ``FLOAT`` (default) parses numbers as float and checks sums
+    of probabilities with ``tolerance``, ``EXACT`` parses them as Decimal.
+
+    Edges of a row have to be contiguous. Sum of probabilities is checked
+    as soon as a row is finished, errors report the line number.
+    """
+    if format is None:
+        name = getattr(file_or_path, 'name', file_or_path)
+        is_json = str(name).endswith(('.jsonl', '.json', '.ndjson'))
+        format = JSON_LINES if is_json else CSV
+    if format not in (CSV, JSON_LINES):
+        raise ValueError('unknown format {0!r}'.format(format))
+
+    if numeric not in (EXACT, FLOAT):
+        raise MatrixInitError('unknown numeric mode', numeric)
+
+    if isinstance(file_or_path, str):
+        with io.open(file_or_path, newline='') as src_file:
+            return _load(src_file, format, size, numeric, tolerance)
+    return _load(file_or_path, format, size, numeric, tolerance)
+
+
+def _load(src_file, format, size, numeric, tolerance):
+    number = float if numeric == FLOAT else Decimal
+    if format == CSV:
+        records = _iter_csv(src_file, number)
+    else:
+        records = _iter_json_lines(src_file, number)
+    row_tolerance = tolerance if numeric == FLOAT else None
+    # Rows are checked while they are streamed, so they are not checked
+    # again when the matrix is built.
+    return SparseTransitionMatrix.from_edges(
+        size, _checked_edges(records, size, row_tolerance), numeric,
+        tolerance, check_rows=False)
+
+
+def _iter_csv(src_file, number):
+    for (line_number, fields) in enumerate(csv.reader(src_file), 1):
+        if not fields:
+            continue
+        if line_number == 1 and not fields[0].strip().lstrip('-').isdigit():
+            continue
+        yield line_number, _parse_edge(line_number, fields, number)
+
+
+def _iter_json_lines(src_file, number):
+    for (line_number, line) in enumerate(src_file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line, parse_float=number)
+        except ValueError as exc:
+            raise MatrixInitError('line {0}: {1}'.format(line_number, exc))
+        if isinstance(record, dict):
+            try:
+                record = [record['src'], record['dst'],
+                          record['probability'], record['resource']]
+            except KeyError as exc:
+                raise MatrixInitError(
+                    'line {0}: missing key {1}'.format(line_number, exc))
+        yield line_number, _parse_edge(line_number, record, number)
+
+
+def _parse_edge(line_number, fields, number):
+    if not isinstance(fields, (list, tuple)) or len(fields) != 4:
+        raise MatrixInitError(
+            'line {0}: expected src, dst, probability and resource'.format(
+                line_number))
+    try:
+        return (int(fields[0]), int(fields[1]),
+                _to_number(fields[2], number), _to_number(fields[3], number))
+    except (TypeError, ValueError, InvalidOperation) as exc:
+        raise MatrixInitError('line {0}: {1}'.format(line_number, exc))
+
+
+def _to_number(value, number):
+    if isinstance(value, str):
+        return number(value.strip())
+    return number(value) if not isinstance(value, number) else value
+
+
+def _checked_edges(records, size, tolerance=None):
+    """Yields edges and checks rows as soon as they are finished."""
+    finished_rows = set()
+    row = None
+    row_of_transitions = []
+    columns = set()
+    row_line_number = None
+    for (line_number, (src, dst, probability, resource)) in records:
+        if src < 0 or dst < 0 or (
+                size is not None and (src >= size or dst >= size)):
+            raise MatrixInitError(
+                'line {0}: vertex index is out of range'.format(line_number))
+        if src != row:
+            _check_row(row, row_of_transitions, row_line_number, tolerance)
+            if src in finished_rows:
+                raise MatrixInitError(
+                    'line {0}: edges of row {1} are not contiguous'.format(
+                        line_number, src))
+            if row is not None:
+                finished_rows.add(row)
+            row = src
+            row_of_transitions = []
+            columns = set()
+            row_line_number = line_number
+        if dst in columns:
+            raise MatrixInitError(
+                'line {0}: transition is defined twice'.format(line_number))
+        columns.add(dst)
+        row_of_transitions.append(Transition(probability, resource))
+        yield src, dst, probability, resource
+    _check_row(row, row_of_transitions, row_line_number, tolerance)
+
+
+def _check_row(row, row_of_transitions, line_number, tolerance):
+    if row is not None and not check_sum_of_probabilities(row_of_transitions,
+                                                          tolerance):
+        raise MatrixInitError(
+            'line {0}: sum of probabilities of row {1} has to be equal to '
+            'zero or one'.format(line_number, row), row_of_transitions)
@@ -1,13 +1,30 @@
 # -*- coding: utf-8 -*-
+import heapq
+import math
+from collections import Counter, namedtuple
+
 from .exceptions import MatrixInitError, LoopExcludeError
-from .utils import (matrix_is_quadratic, last_column_of_matrix,
-                    last_row_of_matrix)
+from .utils import matrix_is_quadratic
+
+
+# Exact mode keeps numbers as they are given (Decimal, Fraction, int) and
+# demands sums of probabilities equal to one exactly. Float mode converts
+# numbers to float and checks sums with tolerance.
+EXACT = 'exact'
+FLOAT = 'float'
+DEFAULT_TOLERANCE = 1e-9
+
+# Vertex is the index of excluded loop or vertex, touched is number of
+# cells updated and created is number of transitions created in empty cells.
+Exclusion = namedtuple('Exclusion', 'vertex touched created')
 
 
 class Transition(object):
     """Transition with probability in which system spend or allocate resource.
     """
 
+    __slots__ = ('probability', 'resource')
+
     def __init__(self, probability, resource):
         """Initializes transition.
 
@@ -40,43 +57,41 @@ class Transition(object):
 class TransitionMatrix(object):
     """Transition matrix."""
 
-    def __init__(self, src_matrix):
-        """Initializes transition matrix."""
-        if not isinstance(src_matrix, list):
-            raise MatrixInitError('expected a list object')
-        if not matrix_is_quadratic(src_matrix):
-            raise MatrixInitError('matrix has to be quadratic')
-
-        self._matrix = []
-        for row_src in src_matrix:
-            row_of_transitions = []
-            for column_src in row_src:
-                transition = self._extract_transition(column_src)
-                row_of_transitions.append(transition)
-
-            if check_sum_of_probabilities(row_of_transitions):
-                self._matrix.append(row_of_transitions)
-            else:
-                raise MatrixInitError(
-                    'sum of probabilities has to be equal to zero or one',
-                    row_of_transitions
-                )
+    def __init__(self, src_matrix, numeric=EXACT,
+                 tolerance=DEFAULT_TOLERANCE):
+        """Initializes transition matrix.
+
+        ``numeric`` is ``EXACT`` or ``FLOAT`` mode, ``tolerance`` is used
+        to check sums of probabilities in float mode.
+
+        Indices of vertices with loops are kept in a set and a heap which
+        are updated by exclusions, so the diagonal is scanned only here.
+        Later a diagonal cell is read when its loop is excluded or a
+        vertex exclusion writes to it. ``counters`` count diagonal reads
+        and loop lookups.
+        """
+        self.numeric = numeric
+        self._matrix = list(
+            iter_transition_rows(src_matrix, numeric, tolerance))
+        self.counters = Counter()
+        self._loops = set()
+        for (row_index, row_of_transitions) in enumerate(self._matrix):
+            self.counters['diagonal_reads'] += 1
+            if row_of_transitions[row_index] is not None:
+                self._loops.add(row_index)
+        # Heap may hold indices of excluded loops, they are skipped when
+        # the first loop is looked up.
+        self._loop_heap = sorted(self._loops)
 
     def __repr__(self):
         return repr(self._matrix)
 
-    def _extract_transition(self, obj_with_two_items):
-        """Returns transition object extracted from iterable object.
+    def __len__(self):
+        return len(self._matrix)
 
-        If object does not contain two items then function returns None.
-        """
-        try:
-            probability, resource = obj_with_two_items
-        except TypeError:
-            transition = None
-        else:
-            transition = Transition(probability=probability, resource=resource)
-        return transition
+    def transition(self, row, column):
+        """Returns transition from ``row`` vertex to ``column`` vertex."""
+        return self._matrix[row][column]
 
     def has_only_source_and_drain(self):
         """Returns True if matrix has got only source and drain."""
@@ -85,52 +100,160 @@ class TransitionMatrix(object):
 
     def loop_exists(self):
         """Returns True if loop exists in transition matrix."""
-        return self._index_of_first_loop() is not None
+        self.counters['loop_lookups'] += 1
+        return bool(self._loops)
 
     def exclude_first_loop(self):
-        """Excludes loop from transition matrix."""
+        """Excludes loop from transition matrix.
+
+        Returns ``Exclusion`` of the loop.
+        """
         row_loop = column_loop = self._index_of_first_loop()
         try:
             loop = self._matrix[row_loop][column_loop]
         except (TypeError, IndexError):
             raise LoopExcludeError('loop does not found')
+        self.counters['diagonal_reads'] += 1
         # Loop delete.
         self._matrix[row_loop][column_loop] = None
+        self._loops.discard(row_loop)
         # Для исключения петли необходимо поделить вероятности передач,
         # которые находятся на одной строке с петлей, на вероятность петли.
-        if any(self._matrix[row_loop]):
-            for (trans_index, trans) in enumerate(self._matrix[row_loop]):
-                if trans is not None:
-                    trans_ = transform_trans_while_excluding_loop(trans, loop)
-                    self._matrix[row_loop][trans_index] = trans_
+        touched = 0
+        for trans in self._matrix[row_loop]:
+            if trans is not None:
+                update_trans_while_excluding_loop(trans, loop)
+                touched += 1
+        return Exclusion(row_loop, touched, 0)
 
     def exclude_last_vertex(self):
-        """Excludes last vertex from transition matrix."""
-        # Для исключения узла необходимо умножить передачу из последнего
-        # столбца на передачу из последней строки. Произведение поместить на
-        # пересечении строки и столбца, сложив его с передачей принимающей
-        # ячейки. Например, если в последнем столбце две передачи, а в
-        # последней строке три передачи, то получим шесть произведений.
-        last_column = last_column_of_matrix(self._matrix)
-        last_row = last_row_of_matrix(self._matrix)
-        for (column_index, column_trans) in enumerate(last_column):
-            for (row_index, row_trans) in enumerate(last_row):
-                if column_trans is not None and row_trans is not None:
-                    host_cell = self._matrix[column_index][row_index]
-                    trans_ = transform_trans_while_excluding_vertex(
+        """Excludes last vertex from transition matrix.
+
+        Returns ``Exclusion`` of the vertex.
+        """
+        return self.exclude_vertex(len(self._matrix) - 1)
+
+    def exclude_vertex(self, index):
+        """Excludes ``index`` vertex from transition matrix.
+
+        Non-empty host cells are updated in place. Returns ``Exclusion``
+        of the vertex.
+        """
+        # Для исключения узла необходимо умножить передачу из его столбца на
+        # передачу из его строки. Произведение поместить на пересечении
+        # строки и столбца, сложив его с передачей принимающей ячейки.
+        # Например, если в столбце две передачи, а в строке три передачи,
+        # то получим шесть произведений.
+        created = 0
+        touched = 0
+        vertex_row = [(row_index, row_trans) for (row_index, row_trans)
+                      in enumerate(self._matrix[index])
+                      if row_trans is not None and row_index != index]
+        for (column_index, row_of_transitions) in enumerate(self._matrix):
+            if column_index == index:
+                continue
+            column_trans = row_of_transitions[index]
+            if column_trans is None:
+                continue
+            touched += len(vertex_row)
+            for (row_index, row_trans) in vertex_row:
+                host_cell = row_of_transitions[row_index]
+                if column_index == row_index:
+                    self.counters['diagonal_reads'] += 1
+                if host_cell is None:
+                    created += 1
+                    if column_index == row_index:
+                        self._loops.add(row_index)
+                        heapq.heappush(self._loop_heap, row_index)
+                    row_of_transitions[row_index] = (
+                        transform_trans_while_excluding_vertex(
+                            column_trans, row_trans))
+                else:
+                    update_trans_while_excluding_vertex(
                         column_trans, row_trans, host_cell)
-                    self._matrix[column_index][row_index] = trans_
-        # Delete last row from transition matrix.
-        self._matrix.pop()
-        # Delete last column from transition matrix.
+        self.remove_vertex(index)
+        return Exclusion(index, touched, created)
+
+    def remove_vertex(self, index):
+        """Removes ``index`` vertex with its transitions, paths through the
+        vertex are lost.
+        """
+        # Delete row of the vertex from transition matrix.
+        self._matrix.pop(index)
+        # Delete column of the vertex from transition matrix.
         for row in self._matrix:
-            row.pop()
+            row.pop(index)
+        self._loops = set(
+            loop_index - (loop_index > index) for loop_index in self._loops
+            if loop_index != index
+        )
+        self._loop_heap = list(self._loops)
+        heapq.heapify(self._loop_heap)
 
-    def _index_of_first_loop(self):
-        """Returns index of first loop in transition matrix."""
+    def iter_transitions(self):
+        """Yields ``(row, column, transition)`` of non-empty cells."""
         for (row_index, row_of_transitions) in enumerate(self._matrix):
-            if row_of_transitions[row_index] is not None:
-                return row_index
+            for (column_index, trans) in enumerate(row_of_transitions):
+                if trans is not None:
+                    yield row_index, column_index, trans
+
+    def _index_of_first_loop(self):
+        """Returns index of first loop in transition matrix.
+
+        Indices of excluded loops are popped from the heap, so the lookup
+        costs O(log k) amortized where k is the number of loops.
+        """
+        self.counters['loop_lookups'] += 1
+        while self._loop_heap and self._loop_heap[0] not in self._loops:
+            heapq.heappop(self._loop_heap)
+        if self._loop_heap:
+            return self._loop_heap[0]
+
+
+def extract_transition(obj_with_two_items):
+    """Returns transition object extracted from iterable object.
+
+    If object does not contain two items then function returns None.
+    """
+    try:
+        probability, resource = obj_with_two_items
+    except TypeError:
+        transition = None
+    else:
+        transition = Transition(probability=probability, resource=resource)
+    return transition
+
+
+def iter_transition_rows(src_matrix, numeric=EXACT,
+                         tolerance=DEFAULT_TOLERANCE):
+    """Yields validated rows of transitions of source matrix.
+
+    Source matrix is a list of lists of ``(probability, resource)`` pairs,
+    empty cells are ``None``. In ``FLOAT`` mode numbers are converted to
+    float and sums of probabilities are checked with ``tolerance``.
+    """
+    if numeric not in (EXACT, FLOAT):
+        raise MatrixInitError('unknown numeric mode', numeric)
+    if not isinstance(src_matrix, list):
+        raise MatrixInitError('expected a list object')
+    if not matrix_is_quadratic(src_matrix):
+        raise MatrixInitError('matrix has to be quadratic')
+
+    for row_src in src_matrix:
+        row_of_transitions = [extract_transition(column_src)
+                              for column_src in row_src]
+        if numeric == FLOAT:
+            row_of_transitions = [to_float(trans)
+                                  for trans in row_of_transitions]
+            row_tolerance = tolerance
+        else:
+            row_tolerance = None
+        if not check_sum_of_probabilities(row_of_transitions, row_tolerance):
+            raise MatrixInitError(
+                'sum of probabilities has to be equal to zero or one',
+                row_of_transitions
+            )
+        yield row_of_transitions
 
 
 def transform_trans_while_excluding_loop(transition, loop):
@@ -163,6 +286,47 @@ def transform_trans_while_excluding_vertex(column_trans, row_trans,
     return Transition(probability=probability, resource=resource)
 
 
-def check_sum_of_probabilities(row):
-    sum_prob = sum(transition.probability for transition in row if transition)
-    return sum_prob == 0 or sum_prob == 1
+def update_trans_while_excluding_loop(transition, loop):
+    """Изменяет передачу ``transition`` на месте при исключении петли."""
+    transition.resource = transition.resource + (
+        (loop.resource * loop.probability) / (1 - loop.probability)
+    )
+    transition.probability = transition.probability / (1 - loop.probability)
+
+
+def update_trans_while_excluding_vertex(column_trans, row_trans, host_cell):
+    """Изменяет непустую передачу ``host_cell`` на месте при исключении
+    вершины.
+    """
+    product = column_trans.probability * row_trans.probability
+    probability = product + host_cell.probability
+    host_cell.resource = (
+        (
+            host_cell.probability * host_cell.resource
+            + product * (column_trans.resource + row_trans.resource)
+        ) / probability
+    )
+    host_cell.probability = probability
+
+
+def to_float(transition):
+    """Converts numbers of transition to float in place and returns it."""
+    if transition is not None:
+        transition.probability = float(transition.probability)
+        transition.resource = float(transition.resource)
+    return transition
+
+
+def check_sum_of_probabilities(row, tolerance=None):
+    """Returns True if sum of probabilities of the row is zero or one.
+
+    Without ``tolerance`` the sum has to be exact, otherwise it is computed
+    with compensated summation and compared within the tolerance.
+    """
+    if tolerance is None:
+        sum_prob = sum(transition.probability
+                       for transition in row if transition)
+        return sum_prob == 0 or sum_prob == 1
+    sum_prob = math.fsum(transition.probability
+                         for transition in row if transition)
+    return abs(sum_prob) <= tolerance or abs(sum_prob - 1) <= tolerance
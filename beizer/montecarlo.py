@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import time
+from collections import namedtuple
+from statistics import NormalDist
+
+import numpy as np
+
+from .models import Transition
+from .utils import DRAIN, SOURCE
+
+# Transition holds estimated probability of reaching drain and expected
+# resource of walks which reached it, intervals are ``(low, high)``
+# confidence intervals of them. Samples is the number of walks, truncated
+# is the number of walks stopped at ``max_steps``.
+Estimate = namedtuple(
+    'Estimate',
+    'transition probability_interval resource_interval samples truncated')
+
+
+def estimate(transition_matrix, samples=10000, time_budget=None, seed=None,
+             batch_size=4096, max_steps=10000, confidence=0.95):
+    """Returns ``Estimate`` of transition from source to drain made by
+    random walks.
+
+    Walks start at source and choose transitions by their probabilities
+    until they reach drain, a vertex without transitions or ``max_steps``.
+    A batch of walks makes one step at a time with array operations.
+    Transitions are kept in compressed rows, so memory is O(V + E).
+
+    Keyword arguments:
+    transition_matrix -- matrix of any backend, it is not changed.
+    samples -- number of walks.
+    time_budget -- seconds after which no new batch is started, at least
+    one batch is run.
+    seed -- seed of the random generator, equal seeds and budgets of
+    samples give equal estimates.
+    batch_size -- number of walks made at once.
+    max_steps -- length of a walk after which it is stopped.
+    confidence -- confidence level of intervals.
+
+    Intervals use normal approximation. Transition and resource interval
+    are None if no walk reached drain.
+    """
+    (offsets, columns, cumulative, resources) = _compressed_rows(
+        transition_matrix)
+    search_steps = int(np.diff(offsets).max()).bit_length()
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+
+    walks = 0
+    truncated = 0
+    reached = []
+    while walks < samples:
+        count = min(batch_size, samples - walks)
+        (batch_reached, batch_truncated) = _walk(
+            offsets, columns, cumulative, resources, search_steps, count,
+            max_steps, rng)
+        reached.append(batch_reached)
+        walks += count
+        truncated += batch_truncated
+        if (time_budget is not None and
+                time.perf_counter() - started >= time_budget):
+            break
+
+    reached = np.concatenate(reached)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    probability = reached.size / walks
+    probability_error = z * (probability * (1 - probability) / walks) ** 0.5
+    probability_interval = (max(0.0, probability - probability_error),
+                            min(1.0, probability + probability_error))
+    if not reached.size:
+        return Estimate(None, probability_interval, None, walks, truncated)
+
+    resource = float(reached.mean())
+    resource_error = 0.0
+    if reached.size > 1:
+        resource_error = (z * float(reached.std(ddof=1)) /
+                          reached.size ** 0.5)
+    return Estimate(Transition(probability=probability, resource=resource),
+                    probability_interval,
+                    (resource - resource_error, resource + resource_error),
+                    walks, truncated)
+
+
+def _compressed_rows(transition_matrix):
+    """Returns row offsets, successors, cumulative probabilities and
+    resources of vertices in compressed sparse row layout.
+
+    Transitions of ``v`` vertex are at ``offsets[v]:offsets[v + 1]``. One
+    padding transition with cumulative probability larger than one ends
+    the arrays, so a search never indexes past them. Drain has no
+    successors.
+    """
+    size = len(transition_matrix)
+    rows = [[] for _ in range(size)]
+    for (row, column, trans) in transition_matrix.iter_transitions():
+        if row != DRAIN:
+            rows[row].append((column, float(trans.probability),
+                              float(trans.resource)))
+    offsets = [0]
+    columns = []
+    cumulative = []
+    resources = []
+    for row in rows:
+        total = 0.0
+        for (column, probability, resource) in row:
+            total += probability
+            columns.append(column)
+            cumulative.append(total)
+            resources.append(resource)
+        offsets.append(len(columns))
+    columns.append(0)
+    cumulative.append(2.0)
+    resources.append(0.0)
+    return (np.array(offsets, dtype=np.intp),
+            np.array(columns, dtype=np.intp),
+            np.array(cumulative), np.array(resources))
+
+
+def _walk(offsets, columns, cumulative, resources, search_steps, count,
+          max_steps, rng):
+    """Returns resources of walks which reached drain and number of walks
+    stopped at ``max_steps``.
+
+    Transition of a walk is the first one of its row whose cumulative
+    probability is above a random threshold. It is found by binary search
+    within the row, ``search_steps`` halvings cover the longest row.
+    """
+    state = np.full(count, SOURCE, dtype=np.intp)
+    spent = np.zeros(count)
+    active = np.arange(count)
+    reached = []
+    for _ in range(max_steps):
+        if not active.size:
+            break
+        vertices = state[active]
+        thresholds = rng.random(active.size)
+        low = offsets[vertices]
+        end = offsets[vertices + 1]
+        high = end.copy()
+        for _ in range(search_steps):
+            middle = (low + high) // 2
+            above = cumulative[middle] > thresholds
+            low = np.where(above, low, np.minimum(middle + 1, high))
+            high = np.where(above, middle, high)
+        # Walk stops if threshold is above sum of probabilities of a row.
+        moved = low < end
+        active = active[moved]
+        choice = low[moved]
+        spent[active] += resources[choice]
+        state[active] = columns[choice]
+
+        at_drain = state[active] == DRAIN
+        reached.append(spent[active[at_drain]])
+        active = active[~at_drain]
+    reached.append(np.empty(0))
+    return np.concatenate(reached), active.size
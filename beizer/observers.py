@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+
+LOOP = 'loop'
+VERTEX = 'vertex'
+
+# Kind is LOOP or VERTEX, vertex is its index in the matrix given to
+# reduce_matrix_size, touched is number of cells updated, created is number
+# of transitions created in empty cells and elapsed is time in seconds.
+ReductionEvent = namedtuple('ReductionEvent',
+                            'kind vertex touched created elapsed')
+
+
+class ReductionStatistics(object):
+    """Observer which summarizes events of ``reduce_matrix_size``.
+
+    Pass an instance as ``observer`` and read its attributes afterwards.
+    Events themselves are kept only if ``keep_events`` is True.
+    """
+
+    def __init__(self, keep_events=False):
+        self.events = [] if keep_events else None
+        self.loops_excluded = 0
+        self.vertices_excluded = 0
+        self.cells_touched = 0
+        self.transitions_created = 0
+        self.loop_seconds = 0.0
+        self.vertex_seconds = 0.0
+        self.slowest_vertex = None
+        self.largest_fill_in = None
+
+    def __call__(self, event):
+        if self.events is not None:
+            self.events.append(event)
+        self.cells_touched += event.touched
+        self.transitions_created += event.created
+        if event.kind == LOOP:
+            self.loops_excluded += 1
+            self.loop_seconds += event.elapsed
+            return
+        self.vertices_excluded += 1
+        self.vertex_seconds += event.elapsed
+        if (self.slowest_vertex is None or
+                event.elapsed > self.slowest_vertex.elapsed):
+            self.slowest_vertex = event
+        if (self.largest_fill_in is None or
+                event.created > self.largest_fill_in.created):
+            self.largest_fill_in = event
+
+    def summary(self):
+        """Returns dictionary of collected statistics."""
+        return {
+            'loops_excluded': self.loops_excluded,
+            'vertices_excluded': self.vertices_excluded,
+            'cells_touched': self.cells_touched,
+            'transitions_created': self.transitions_created,
+            'loop_seconds': self.loop_seconds,
+            'vertex_seconds': self.vertex_seconds,
+            'slowest_vertex': (None if self.slowest_vertex is None
+                               else self.slowest_vertex.vertex),
+            'largest_fill_in': (None if self.largest_fill_in is None
+                                else self.largest_fill_in.vertex),
+        }
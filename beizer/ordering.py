@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import heapq
+
+from .exceptions import MatrixReduceError
+
+LAST_VERTEX = 'last_vertex'
+MINIMUM_DEGREE = 'minimum_degree'
+MINIMUM_FILL = 'minimum_fill'
+
+
+def elimination_order(transition_matrix, strategy=None, keep=(0, 1)):
+    """Returns indices of vertices in order of their exclusion.
+
+    Keyword arguments:
+    transition_matrix -- matrix which is going to be reduced.
+    strategy -- ``LAST_VERTEX`` (default), ``MINIMUM_DEGREE``,
+    ``MINIMUM_FILL`` or a sequence of vertex indices supplied by caller.
+    keep -- indices of vertices which are never excluded, source and drain
+    by default.
+
+    Indices refer to vertices of the matrix as it is now, they are not
+    shifted by preceding exclusions.
+    """
+    keep = frozenset(keep)
+    size = len(transition_matrix)
+    if strategy is None or strategy == LAST_VERTEX:
+        return [vertex for vertex in reversed(range(size))
+                if vertex not in keep]
+    if strategy == MINIMUM_DEGREE:
+        return _greedy_order(transition_matrix, keep, _degree_cost)
+    if strategy == MINIMUM_FILL:
+        return _greedy_order(transition_matrix, keep, _fill_cost)
+
+    order = list(strategy)
+    expected = set(range(size)) - keep
+    if len(order) != len(expected) or set(order) != expected:
+        raise MatrixReduceError(
+            'order has to list every vertex except kept ones exactly once',
+            order
+        )
+    return order
+
+
+class Pattern(object):
+    """Sparsity pattern which can be passed instead of a matrix."""
+
+    def __init__(self, size, edges):
+        """Keeps ``size`` vertices and ``(row, column)`` edges."""
+        self._size = size
+        self._edges = edges
+
+    def __len__(self):
+        return self._size
+
+    def iter_transitions(self):
+        """Yields ``(row, column, None)`` for every edge."""
+        for (row, column) in self._edges:
+            yield row, column, None
+
+
+def transition_pattern(transition_matrix):
+    """Returns successors and predecessors of every vertex, loops excluded.
+    """
+    size = len(transition_matrix)
+    successors = [set() for _ in range(size)]
+    predecessors = [set() for _ in range(size)]
+    for (row, column, _) in transition_matrix.iter_transitions():
+        if row != column:
+            successors[row].add(column)
+            predecessors[column].add(row)
+    return successors, predecessors
+
+
+def _degree_cost(vertex, successors, predecessors):
+    """Number of host cells touched when the vertex is excluded."""
+    return len(predecessors[vertex]) * len(successors[vertex])
+
+
+def _fill_cost(vertex, successors, predecessors):
+    """Number of transitions created when the vertex is excluded.
+
+    Loops which appear on neighbours are counted too because they are
+    excluded right away and never become host cells.
+    """
+    cost = 0
+    for row in predecessors[vertex]:
+        row_successors = successors[row]
+        for column in successors[vertex]:
+            if row == column or column not in row_successors:
+                cost += 1
+    return cost
+
+
+def _greedy_order(transition_matrix, keep, cost):
+    """Returns order which excludes the cheapest vertex at every step.
+
+    Costs of neighbours of excluded vertex are recomputed and stale heap
+    entries are skipped.
+    """
+    successors, predecessors = transition_pattern(transition_matrix)
+    costs = {}
+    heap = []
+    for vertex in range(len(successors)):
+        if vertex not in keep:
+            costs[vertex] = cost(vertex, successors, predecessors)
+            heap.append((costs[vertex], -vertex))
+    heapq.heapify(heap)
+
+    order = []
+    while heap:
+        (vertex_cost, vertex) = heapq.heappop(heap)
+        vertex = -vertex
+        if costs.get(vertex) != vertex_cost:
+            continue
+        del costs[vertex]
+        order.append(vertex)
+
+        neighbours = _exclude_from_pattern(vertex, successors, predecessors)
+        if cost is _fill_cost:
+            for neighbour in list(neighbours):
+                neighbours.update(successors[neighbour])
+                neighbours.update(predecessors[neighbour])
+        for neighbour in neighbours:
+            if neighbour in costs:
+                costs[neighbour] = cost(neighbour, successors, predecessors)
+                heapq.heappush(heap, (costs[neighbour], -neighbour))
+    return order
+
+
+def _exclude_from_pattern(vertex, successors, predecessors):
+    """Excludes vertex from the pattern and returns its former neighbours."""
+    for row in predecessors[vertex]:
+        successors[row].discard(vertex)
+        for column in successors[vertex]:
+            if row != column:
+                successors[row].add(column)
+                predecessors[column].add(row)
+    for column in successors[vertex]:
+        predecessors[column].discard(vertex)
+    neighbours = predecessors[vertex] | successors[vertex]
+    successors[vertex] = set()
+    predecessors[vertex] = set()
+    return neighbours
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+from bisect import bisect_left
+from collections import Counter, deque
+from functools import partial
+from multiprocessing import Pool, cpu_count
+
+from .core import reduce_matrix_size
+from .exceptions import MatrixReduceError
+from .models import EXACT, Transition
+from .ordering import (LAST_VERTEX, MINIMUM_DEGREE, MINIMUM_FILL,
+                       elimination_order)
+from .sparse import SparseTransitionMatrix
+
+
+def partition(transition_matrix, parts, keep=(0, 1)):
+    """Splits vertices into regions joined by a separator.
+
+    Vertices except kept ones are visited breadth first and cut into
+    ``parts`` chunks of equal size. An end of every transition between
+    chunks is moved to the separator, the one with more such transitions,
+    so interior vertices of different regions are never adjacent.
+
+    Returns sorted separator, which includes kept vertices, and sorted
+    interior vertices of every region.
+    """
+    size = len(transition_matrix)
+    keep = frozenset(keep)
+    neighbours = [set() for _ in range(size)]
+    transitions = []
+    for (row, column, _) in transition_matrix.iter_transitions():
+        if row != column:
+            neighbours[row].add(column)
+            neighbours[column].add(row)
+            transitions.append((row, column))
+
+    visited = [vertex in keep for vertex in range(size)]
+    visit_order = []
+    for start in range(size):
+        if visited[start]:
+            continue
+        visited[start] = True
+        queue = deque([start])
+        while queue:
+            vertex = queue.popleft()
+            visit_order.append(vertex)
+            for neighbour in sorted(neighbours[vertex]):
+                if not visited[neighbour]:
+                    visited[neighbour] = True
+                    queue.append(neighbour)
+
+    parts = max(1, min(parts, len(visit_order)))
+    region_of = {}
+    for (position, vertex) in enumerate(visit_order):
+        region_of[vertex] = position * parts // len(visit_order)
+
+    cut = [(row, column) for (row, column) in transitions
+           if row in region_of and column in region_of and
+           region_of[row] != region_of[column]]
+    cut_degree = Counter(vertex for edge in cut for vertex in edge)
+    separator = set(keep)
+    for (row, column) in cut:
+        if row not in separator and column not in separator:
+            separator.add(max(row, column, key=cut_degree.__getitem__))
+
+    regions = [[] for _ in range(parts)]
+    for vertex in sorted(region_of):
+        if vertex not in separator:
+            regions[region_of[vertex]].append(vertex)
+    return sorted(separator), [region for region in regions if region]
+
+
+def reduce_partitioned(transition_matrix, parts=None, processes=None,
+                       order=None):
+    """Returns transition from source to drain found by reduction of
+    regions in a pool of processes.
+
+    Keyword arguments:
+    transition_matrix -- matrix of any backend, it is not changed.
+    parts -- number of regions, number of processes by default.
+    processes -- number of worker processes, number of CPUs by default.
+    order -- ``LAST_VERTEX``, ``MINIMUM_DEGREE`` or ``MINIMUM_FILL``
+    strategy used inside regions and for the separator.
+
+    Workers exclude interior vertices of their regions. Every worker
+    returns transitions between separator vertices made by its region,
+    they are merged with transitions of the separator as parallel
+    transitions and the separator matrix is reduced as usual. The result
+    is the one ``reduce_matrix_size`` gives for the whole matrix.
+    """
+    if order not in (None, LAST_VERTEX, MINIMUM_DEGREE, MINIMUM_FILL):
+        raise MatrixReduceError('order has to be a strategy', order)
+    if parts is None:
+        parts = processes or cpu_count()
+    numeric = getattr(transition_matrix, 'numeric', EXACT)
+
+    (separator, regions) = partition(transition_matrix, parts)
+    region_of = {}
+    for (region_index, region) in enumerate(regions):
+        for vertex in region:
+            region_of[vertex] = region_index
+    region_edges = [[] for _ in regions]
+    separator_edges = []
+    for (row, column, trans) in transition_matrix.iter_transitions():
+        edge = (row, column, trans.probability, trans.resource)
+        region_index = region_of.get(row, region_of.get(column))
+        if region_index is None:
+            separator_edges.append(edge)
+        else:
+            region_edges[region_index].append(edge)
+
+    pool = Pool(processes)
+    try:
+        contributions = pool.map(
+            partial(_reduce_region, order=order, numeric=numeric),
+            zip(regions, region_edges))
+    finally:
+        pool.close()
+        pool.join()
+
+    merged = _merge_parallel([separator_edges] + contributions)
+    separator_index = dict(
+        (vertex, index) for (index, vertex) in enumerate(separator))
+    separator_matrix = SparseTransitionMatrix.from_edges(
+        len(separator),
+        ((separator_index[row], separator_index[column], trans.probability,
+          trans.resource) for ((row, column), trans) in merged.items()),
+        numeric, check_rows=False)
+    reduce_matrix_size(separator_matrix, order)
+    return separator_matrix.transition(0, 1)
+
+
+def _reduce_region(region, order=None, numeric=EXACT):
+    """Excludes interior vertices of the region.
+
+    Only the loop of excluded vertex is excluded, loops of separator
+    vertices get contributions from other regions too. Returns
+    ``(row, column, probability, resource)`` transitions left between
+    separator vertices.
+    """
+    (interior, edges) = region
+    local_vertices = sorted(set(
+        vertex for edge in edges for vertex in edge[:2]))
+    local_index = dict(
+        (vertex, index) for (index, vertex) in enumerate(local_vertices))
+    local_matrix = SparseTransitionMatrix.from_edges(
+        len(local_vertices),
+        ((local_index[row], local_index[column], probability, resource)
+         for (row, column, probability, resource) in edges),
+        numeric, check_rows=False)
+    interior_indices = frozenset(local_index[vertex] for vertex in interior)
+    keep = [index for index in range(len(local_vertices))
+            if index not in interior_indices]
+
+    vertices = list(range(len(local_vertices)))
+    for vertex in elimination_order(local_matrix, order, keep):
+        index = bisect_left(vertices, vertex)
+        del vertices[index]
+        if local_matrix.transition(index, index) is not None:
+            local_matrix.exclude_loop(index)
+        local_matrix.exclude_vertex(index)
+    return [(local_vertices[keep[row]], local_vertices[keep[column]],
+             trans.probability, trans.resource)
+            for (row, column, trans) in local_matrix.iter_transitions()]
+
+
+def _merge_parallel(groups_of_edges):
+    """Returns dict which maps cells to transitions merged as parallel
+    transitions.
+    """
+    merged = {}
+    for edges in groups_of_edges:
+        for (row, column, probability, resource) in edges:
+            trans = merged.get((row, column))
+            if trans is None:
+                merged[(row, column)] = Transition(probability, resource)
+                continue
+            total = trans.probability + probability
+            if total:
+                trans.resource = (trans.probability * trans.resource +
+                                  probability * resource) / total
+            trans.probability = total
+    return merged
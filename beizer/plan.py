@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+
+from .models import Transition
+from .ordering import Pattern, elimination_order
+
+PLAN_CACHE_SIZE = 128
+
+_LOOP = 0
+_VERTEX = 1
+
+
+class EliminationPlan(object):
+    """Sequence of exclusions compiled from a sparsity pattern.
+
+    The plan repeats every structural decision of ``reduce_matrix_size``
+    made for the pattern: which loops are excluded, which cells a vertex
+    exclusion touches and which of them are empty. Running the plan for new
+    values only does the arithmetic, the result is identical to a fresh
+    reduction of the matrix with the same pattern.
+    """
+
+    def __init__(self, size, edges, order=None):
+        """Compiles plan.
+
+        Keyword arguments:
+        size -- number of vertices.
+        edges -- ``(row, column)`` pairs of non-empty cells, values passed
+        to ``run`` have to follow the same order.
+        order -- elimination order accepted by ``reduce_matrix_size``.
+
+        """
+        self.size = size
+        self.edges = [tuple(edge) for edge in edges]
+        self._operations = []
+
+        out_slots = [{} for _ in range(size)]
+        in_slots = [{} for _ in range(size)]
+        loops = set()
+        for (slot, (row, column)) in enumerate(self.edges):
+            out_slots[row][column] = in_slots[column][row] = slot
+            if row == column:
+                loops.add(row)
+        self._slots = len(self.edges)
+
+        pattern = Pattern(size, self.edges)
+        for vertex in elimination_order(pattern, order):
+            self._exclude_loops(loops, out_slots, in_slots)
+            self._exclude_vertex(vertex, loops, out_slots, in_slots)
+        self._exclude_loops(loops, out_slots, in_slots)
+
+        self.new_slots = self._slots - len(self.edges)
+        self._result = out_slots[0].get(1) if size > 1 else None
+
+    def _exclude_loops(self, loops, out_slots, in_slots):
+        for vertex in sorted(loops):
+            loop = out_slots[vertex].pop(vertex)
+            del in_slots[vertex][vertex]
+            self._operations.append(
+                (_LOOP, loop, tuple(out_slots[vertex].values())))
+        loops.clear()
+
+    def _exclude_vertex(self, vertex, loops, out_slots, in_slots):
+        updates = []
+        for (row, column_slot) in in_slots[vertex].items():
+            for (column, row_slot) in out_slots[vertex].items():
+                host_slot = out_slots[row].get(column)
+                if host_slot is None:
+                    host_slot = self._slots
+                    self._slots += 1
+                    out_slots[row][column] = in_slots[column][row] = host_slot
+                    if row == column:
+                        loops.add(row)
+                updates.append((column_slot, row_slot, host_slot))
+        self._operations.append((_VERTEX, tuple(updates)))
+
+        for row in in_slots[vertex]:
+            del out_slots[row][vertex]
+        for column in out_slots[vertex]:
+            del in_slots[column][vertex]
+        out_slots[vertex] = {}
+        in_slots[vertex] = {}
+
+    def run(self, values):
+        """Returns transition from source to drain for new values.
+
+        ``values`` are ``(probability, resource)`` pairs of ``edges``.
+        """
+        (probability, resource) = self._slot_values(values)
+        self._forward(probability, resource)
+        if self._result is None:
+            return None
+        return Transition(probability=probability[self._result],
+                          resource=resource[self._result])
+
+    def gradients(self, values):
+        """Returns transition from source to drain and its derivatives.
+
+        Derivatives are found by reverse accumulation through the
+        operations of the plan, it costs about three runs. Returns the
+        transition, derivatives of its probability and derivatives of its
+        resource. Derivatives are lists of ``(by probability, by resource)``
+        pairs of ``edges``.
+        """
+        (probability, resource) = self._slot_values(values)
+        tape = []
+        self._forward(probability, resource, tape)
+        if self._result is None:
+            zeros = [(0, 0)] * len(self.edges)
+            return None, zeros, list(zeros)
+
+        derivatives = []
+        for seed in ((1, 0), (0, 1)):
+            adjoint_probability = [0] * len(probability)
+            adjoint_resource = [0] * len(resource)
+            (adjoint_probability[self._result],
+             adjoint_resource[self._result]) = seed
+            self._backward(probability, resource, tape,
+                           adjoint_probability, adjoint_resource)
+            derivatives.append(
+                list(zip(adjoint_probability[:len(self.edges)],
+                         adjoint_resource[:len(self.edges)])))
+        trans = Transition(probability=probability[self._result],
+                           resource=resource[self._result])
+        return trans, derivatives[0], derivatives[1]
+
+    def _slot_values(self, values):
+        probability = [value[0] for value in values]
+        resource = [value[1] for value in values]
+        if len(probability) != len(self.edges):
+            raise ValueError('expected {0} values'.format(len(self.edges)))
+        probability.extend([0] * self.new_slots)
+        resource.extend([0] * self.new_slots)
+        return probability, resource
+
+    def _forward(self, probability, resource, tape=None):
+        """Runs operations, ``tape`` gets values of slots they overwrite.
+        """
+        for operation in self._operations:
+            if operation[0] == _LOOP:
+                if tape is not None:
+                    tape.append([(probability[slot], resource[slot])
+                                 for slot in operation[2]])
+                loop_probability = probability[operation[1]]
+                loop_resource = resource[operation[1]]
+                for slot in operation[2]:
+                    probability[slot] = (
+                        probability[slot] / (1 - loop_probability))
+                    resource[slot] = resource[slot] + (
+                        (loop_resource * loop_probability)
+                        / (1 - loop_probability)
+                    )
+            else:
+                if tape is not None:
+                    tape.append([(probability[host_slot], resource[host_slot])
+                                 for (_, _, host_slot) in operation[1]])
+                for (column_slot, row_slot, host_slot) in operation[1]:
+                    host_probability = probability[host_slot]
+                    product = probability[column_slot] * probability[row_slot]
+                    probability[host_slot] = product + host_probability
+                    resource[host_slot] = (
+                        (
+                            host_probability * resource[host_slot]
+                            + product
+                            * (resource[column_slot] + resource[row_slot])
+                        ) / probability[host_slot]
+                    )
+
+    def _backward(self, probability, resource, tape, adjoint_probability,
+                  adjoint_resource):
+        """Propagates adjoints of slots back to values of ``edges``.
+
+        Loop slots and slots of excluded vertices are never written after
+        the operation which reads them, so their final values are the ones
+        the operation used.
+        """
+        for (operation, overwritten) in zip(reversed(self._operations),
+                                            reversed(tape)):
+            if operation[0] == _LOOP:
+                loop_slot = operation[1]
+                loop_probability = probability[loop_slot]
+                loop_resource = resource[loop_slot]
+                factor = 1 / (1 - loop_probability)
+                for (slot, (old_probability, _)) in zip(operation[2],
+                                                        overwritten):
+                    adjoint_probability[loop_slot] += factor * factor * (
+                        adjoint_probability[slot] * old_probability +
+                        adjoint_resource[slot] * loop_resource)
+                    adjoint_resource[loop_slot] += (
+                        adjoint_resource[slot] * loop_probability * factor)
+                    adjoint_probability[slot] *= factor
+                continue
+
+            for ((column_slot, row_slot, host_slot),
+                 (host_probability, host_resource)) in zip(operation[1],
+                                                           overwritten):
+                column_probability = probability[column_slot]
+                row_probability = probability[row_slot]
+                product = column_probability * row_probability
+                new_probability = product + host_probability
+                path_resource = resource[column_slot] + resource[row_slot]
+                new_resource = (host_probability * host_resource +
+                                product * path_resource) / new_probability
+
+                adjoint_new_probability = adjoint_probability[host_slot]
+                adjoint_new_resource = (adjoint_resource[host_slot] /
+                                        new_probability)
+                adjoint_product = (
+                    adjoint_new_probability +
+                    adjoint_new_resource * (path_resource - new_resource))
+                adjoint_probability[column_slot] += (
+                    adjoint_product * row_probability)
+                adjoint_probability[row_slot] += (
+                    adjoint_product * column_probability)
+                adjoint_resource[column_slot] += adjoint_new_resource * product
+                adjoint_resource[row_slot] += adjoint_new_resource * product
+                adjoint_probability[host_slot] = (
+                    adjoint_new_probability +
+                    adjoint_new_resource * (host_resource - new_resource))
+                adjoint_resource[host_slot] = (
+                    adjoint_new_resource * host_probability)
+
+
+_plans = OrderedDict()
+
+
+def compile_plan(size, edges, order=None):
+    """Returns cached plan for the pattern, compiles it on the first call.
+    """
+    edges = tuple(tuple(edge) for edge in edges)
+    order_key = order if order is None or isinstance(order, str) else tuple(
+        order)
+    key = (size, edges, order_key)
+    try:
+        plan = _plans.pop(key)
+    except KeyError:
+        plan = EliminationPlan(size, edges, order)
+        if len(_plans) >= PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    _plans[key] = plan
+    return plan
+
+
+def split_matrix(transition_matrix):
+    """Returns ``(size, edges, values)`` of transition matrix.
+
+    Edges and values can be passed to ``compile_plan`` and ``run``.
+    """
+    edges = []
+    values = []
+    for (row, column, trans) in transition_matrix.iter_transitions():
+        edges.append((row, column))
+        values.append((trans.probability, trans.resource))
+    return len(transition_matrix), edges, values
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+
+from .plan import EliminationPlan, split_matrix
+
+# Transition is the transition from source to drain. Probability and
+# resource map ``(row, column)`` of every transition of the matrix to
+# derivatives of probability and resource of the result by probability and
+# resource of that transition.
+Sensitivity = namedtuple('Sensitivity', 'transition probability resource')
+
+
+def sensitivities(transition_matrix, order=None):
+    """Returns ``Sensitivity`` of transition from source to drain.
+
+    Arithmetic of loop and vertex exclusions is recorded during a single
+    reduction and derivatives are accumulated backwards through it, so the
+    cost is a small multiple of one reduction. The matrix is not changed.
+
+    Transition is None if drain is not reachable, all derivatives are zero
+    then.
+    """
+    (size, edges, values) = split_matrix(transition_matrix)
+    plan = EliminationPlan(size, edges, order)
+    (trans, probability, resource) = plan.gradients(values)
+    return Sensitivity(trans, dict(zip(plan.edges, probability)),
+                       dict(zip(plan.edges, resource)))
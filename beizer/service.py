@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""Evaluation service which reduces models sent as JSON lines over TCP.
+
+Every request line is an object with ``size`` and ``edges`` holding
+``[src, dst, probability, resource]`` lists and an optional ``id``. Every
+response line has the same ``id`` and either ``probability`` and
+``resource`` of transition from source to drain, which are null if drain is
+not reachable, or ``error``. Responses of a connection may come in any
+order.
+
+Run ``python -m beizer.service --help`` for options.
+"""
+import argparse
+import asyncio
+import json
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .models import DEFAULT_TOLERANCE, Transition, check_sum_of_probabilities
+from .plan import compile_plan
+
+
+class ReductionService(object):
+    """Reduces models in a pool of processes.
+
+    Requests which arrive within ``window`` seconds and share size and
+    edges are sent to a worker together. Workers keep compiled elimination
+    plans of recent topologies, so a group costs one run of a plan per
+    model.
+    """
+
+    def __init__(self, processes=None, window=0.005, max_batch=256,
+                 max_pending=1024, timeout=10.0, order=None,
+                 limit=2 ** 26):
+        """Initializes service.
+
+        Keyword arguments:
+        processes -- number of worker processes, number of CPUs by default.
+        window -- seconds requests wait for others of the same topology.
+        max_batch -- size of a group which is sent without waiting.
+        max_pending -- number of requests in progress, connections are not
+        read while it is reached.
+        timeout -- seconds after which a request fails.
+        order -- elimination order accepted by ``reduce_matrix_size``.
+        limit -- length of a request line in bytes, longer lines get an
+        error response.
+
+        """
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.order = order
+        self.limit = limit
+        self._processes = processes
+        self._executor = None
+        self._pending = None
+        self._max_pending = max_pending
+        self._groups = {}
+        self._server = None
+        self._connections = {}
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Starts the pool and listens, returns ``(host, port)``."""
+        self._executor = ProcessPoolExecutor(self._processes)
+        self._pending = asyncio.Semaphore(self._max_pending)
+        self._server = await asyncio.start_server(
+            self._handle_connection, host, port, limit=self.limit)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        """Stops listening, drops connections with their requests in
+        progress and shuts the pool down.
+        """
+        if self._server is not None:
+            self._server.close()
+            for (connection, writer) in self._connections.items():
+                writer.close()
+                connection.cancel()
+            if self._connections:
+                await asyncio.wait(list(self._connections))
+            await self._server.wait_closed()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    async def evaluate(self, size, edges):
+        """Returns transition from source to drain of the model.
+
+        Raises ``ValueError`` if the model is malformed and
+        ``asyncio.TimeoutError`` if it is not reduced in time.
+        """
+        return await asyncio.wait_for(self._submit(size, edges),
+                                      self.timeout)
+
+    def _submit(self, size, edges):
+        key = (size, tuple((row, column) for (row, column, _, _) in edges))
+        values = [(probability, resource)
+                  for (_, _, probability, resource) in edges]
+        future = asyncio.get_running_loop().create_future()
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = []
+            asyncio.get_running_loop().call_later(
+                self.window, self._flush, key, group)
+        group.append((values, future))
+        if len(group) >= self.max_batch:
+            self._flush(key, group)
+        return future
+
+    def _flush(self, key, group):
+        if self._groups.get(key) is not group:
+            return
+        del self._groups[key]
+        (size, edges) = key
+        futures = [future for (_, future) in group]
+        args = (_reduce_group, size, edges,
+                [values for (values, _) in group], self.order)
+        loop = asyncio.get_running_loop()
+        try:
+            task = loop.run_in_executor(self._executor, *args)
+        except BrokenProcessPool:
+            # A worker died while the pool was idle.
+            self._replace_executor(self._executor)
+            try:
+                task = loop.run_in_executor(self._executor, *args)
+            except Exception as exc:
+                _fail(futures, exc)
+                return
+        executor = self._executor
+
+        def done(task):
+            if (not task.cancelled() and
+                    isinstance(task.exception(), BrokenProcessPool)):
+                self._replace_executor(executor)
+            _resolve(futures, task)
+        task.add_done_callback(done)
+
+    def _replace_executor(self, executor):
+        """Replaces broken pool unless it is already replaced."""
+        if self._executor is executor:
+            self._executor = ProcessPoolExecutor(self._processes)
+            executor.shutdown(wait=False)
+
+    async def _handle_connection(self, reader, writer):
+        connection = asyncio.current_task()
+        self._connections[connection] = writer
+        tasks = set()
+        try:
+            while True:
+                # A place among pending requests is taken before a line is
+                # read, so connections are not read while all are taken.
+                await self._pending.acquire()
+                try:
+                    line = await self._read_line(reader)
+                except BaseException:
+                    self._pending.release()
+                    raise
+                if line is None:
+                    try:
+                        await self._write(writer, {
+                            'id': None,
+                            'error': 'line is longer than {0} bytes'.format(
+                                self.limit),
+                        })
+                    finally:
+                        self._pending.release()
+                    continue
+                if not line.strip():
+                    self._pending.release()
+                    if not line:
+                        break
+                    continue
+                task = asyncio.ensure_future(self._respond(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _: self._pending.release())
+            if tasks:
+                await asyncio.wait(tasks)
+        except asyncio.CancelledError:
+            # Service is closed. The connection task ends normally, stream
+            # protocol of Python 3.11 logs cancelled connection tasks.
+            for task in tasks:
+                task.cancel()
+        finally:
+            del self._connections[connection]
+            writer.close()
+
+    async def _read_line(self, reader):
+        """Returns next line or None if it is longer than the limit, the
+        rest of that line is skipped.
+        """
+        try:
+            return await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as exc:
+            return exc.partial
+        except asyncio.LimitOverrunError as exc:
+            consumed = exc.consumed
+        while True:
+            await reader.readexactly(consumed)
+            try:
+                await reader.readuntil(b'\n')
+                return None
+            except asyncio.IncompleteReadError:
+                return None
+            except asyncio.LimitOverrunError as exc:
+                consumed = exc.consumed
+
+    async def _write(self, writer, response):
+        writer.write(json.dumps(response).encode('utf-8') + b'\n')
+        await writer.drain()
+
+    async def _respond(self, line, writer):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            trans = await self.evaluate(
+                int(request['size']),
+                [(int(row), int(column), float(probability), float(resource))
+                 for (row, column, probability, resource)
+                 in request['edges']])
+        except asyncio.TimeoutError:
+            response = {'id': request_id, 'error': 'timeout'}
+        except (ValueError, TypeError, KeyError, AttributeError) as exc:
+            response = {'id': request_id, 'error': str(exc)}
+        except Exception as exc:
+            # E.g. BrokenProcessPool, the client still gets a response.
+            response = {'id': request_id,
+                        'error': '{0}: {1}'.format(type(exc).__name__, exc)}
+        else:
+            response = {
+                'id': request_id,
+                'probability': None if trans is None else trans.probability,
+                'resource': None if trans is None else trans.resource,
+            }
+        await self._write(writer, response)
+
+
+def _resolve(futures, task):
+    if task.cancelled():
+        return
+    exc = task.exception()
+    results = [exc] * len(futures) if exc is not None else task.result()
+    for (future, result) in zip(futures, results):
+        if future.done():
+            continue
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+
+def _fail(futures, exc):
+    for future in futures:
+        if not future.done():
+            future.set_exception(exc)
+
+
+def _reduce_group(size, edges, group_values, order=None):
+    """Returns transitions or errors of models which share topology."""
+    if any(not 0 <= index < size for edge in edges for index in edge):
+        return [ValueError('vertex index is out of range')] * len(
+            group_values)
+    if len(set(edges)) != len(edges):
+        return [ValueError('transition is defined twice')] * len(
+            group_values)
+    plan = compile_plan(size, edges, order)
+    results = []
+    for values in group_values:
+        rows = defaultdict(list)
+        for ((row, _), (probability, resource)) in zip(edges, values):
+            rows[row].append(Transition(probability, resource))
+        if not all(check_sum_of_probabilities(row, DEFAULT_TOLERANCE)
+                   for row in rows.values()):
+            results.append(ValueError(
+                'sum of probabilities has to be equal to zero or one'))
+            continue
+        try:
+            results.append(plan.run(values))
+        except ZeroDivisionError:
+            results.append(ValueError('loop probability is equal to one'))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve reduction of models sent as JSON lines.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes')
+    parser.add_argument('--window', type=float, default=0.005,
+                        help='seconds requests wait to be grouped')
+    parser.add_argument('--max-pending', type=int, default=1024,
+                        help='number of requests in progress')
+    parser.add_argument('--timeout', type=float, default=10.0,
+                        help='seconds after which a request fails')
+    parser.add_argument('--order', default=None,
+                        help='elimination order strategy')
+    parser.add_argument('--limit', type=int, default=2 ** 26,
+                        help='length of a request line in bytes')
+    args = parser.parse_args(argv)
+
+    service = ReductionService(processes=args.processes, window=args.window,
+                               max_pending=args.max_pending,
+                               timeout=args.timeout, order=args.order,
+                               limit=args.limit)
+
+    async def serve():
+        (host, port) = await service.start(args.host, args.port)
+        print('Listening on {0}:{1}'.format(host, port))
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from bisect import bisect_left
+from collections import deque, namedtuple
+
+from .ordering import transition_pattern
+from .utils import DRAIN, SOURCE
+
+# Sizes of the matrix before and after simplification, number of removed
+# vertices which are not on any path from source to drain and number of
+# collapsed series vertices.
+Simplification = namedtuple(
+    'Simplification',
+    'vertices_before vertices_after transitions_before transitions_after '
+    'removed collapsed')
+
+
+def simplify(transition_matrix):
+    """Makes matrix smaller before reduction without changing transition
+    from source to drain.
+
+    Vertices which are not reachable from source or from which drain is
+    not reachable are removed. Then every vertex without loop which has
+    one predecessor and one successor is excluded. Its transition is put
+    in series with the incoming one and merged with a parallel transition
+    if the cell is not empty.
+
+    Source and drain keep their indices, the rest keep relative order.
+    Returns ``Simplification``.
+    """
+    vertices_before = len(transition_matrix)
+    transitions_before = _count_transitions(transition_matrix)
+
+    (successors, predecessors) = transition_pattern(transition_matrix)
+    on_path = (_reachable(SOURCE, successors) &
+               _reachable(DRAIN, predecessors)) | set([SOURCE, DRAIN])
+    removed = [vertex for vertex in range(vertices_before)
+               if vertex not in on_path]
+    for vertex in reversed(removed):
+        transition_matrix.remove_vertex(vertex)
+
+    collapsed = _collapse_series(transition_matrix)
+    return Simplification(vertices_before, len(transition_matrix),
+                          transitions_before,
+                          _count_transitions(transition_matrix),
+                          len(removed), collapsed)
+
+
+def _reachable(start, neighbours):
+    """Returns vertices reachable from ``start`` including itself."""
+    visited = set([start])
+    queue = deque([start])
+    while queue:
+        for neighbour in neighbours[queue.popleft()]:
+            if neighbour not in visited:
+                visited.add(neighbour)
+                queue.append(neighbour)
+    return visited
+
+
+def _collapse_series(transition_matrix):
+    """Excludes series vertices and returns their number."""
+    (successors, predecessors) = transition_pattern(transition_matrix)
+    loops = set(row for (row, column, _)
+                in transition_matrix.iter_transitions() if row == column)
+    vertices = list(range(len(transition_matrix)))
+    candidates = list(reversed(vertices))
+    collapsed = 0
+    while candidates:
+        vertex = candidates.pop()
+        if (vertex in (SOURCE, DRAIN) or vertex in loops or
+                len(predecessors[vertex]) != 1 or
+                len(successors[vertex]) != 1):
+            continue
+        index = bisect_left(vertices, vertex)
+        if index == len(vertices) or vertices[index] != vertex:
+            continue
+        transition_matrix.exclude_vertex(index)
+        del vertices[index]
+        collapsed += 1
+
+        (row,) = predecessors[vertex]
+        (column,) = successors[vertex]
+        successors[row].discard(vertex)
+        predecessors[column].discard(vertex)
+        if row == column:
+            loops.add(row)
+        else:
+            successors[row].add(column)
+            predecessors[column].add(row)
+        candidates.extend((row, column))
+    return collapsed
+
+
+def _count_transitions(transition_matrix):
+    return sum(1 for _ in transition_matrix.iter_transitions())
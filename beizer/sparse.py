@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+from bisect import bisect_left
+
+from .exceptions import MatrixInitError, LoopExcludeError
+from .models import (EXACT, FLOAT, DEFAULT_TOLERANCE, Exclusion,
+                     Transition, iter_transition_rows, to_float,
+                     transform_trans_while_excluding_vertex,
+                     update_trans_while_excluding_loop,
+                     update_trans_while_excluding_vertex,
+                     check_sum_of_probabilities)
+
+
+class SparseTransitionMatrix(object):
+    """Transition matrix stored as adjacency maps.
+
+    Every vertex has a map of outgoing and a map of incoming transitions,
+    so memory scales with the number of transitions and exclusion of a
+    vertex costs in-degree times out-degree. Vertices are addressed by
+    their position like in ``TransitionMatrix``.
+    """
+
+    def __init__(self, src_matrix, numeric=EXACT,
+                 tolerance=DEFAULT_TOLERANCE):
+        """Initializes transition matrix.
+
+        ``numeric`` and ``tolerance`` have the same meaning as in
+        ``TransitionMatrix``.
+        """
+        rows = list(iter_transition_rows(src_matrix, numeric, tolerance))
+        self.numeric = numeric
+        self._init_storage(len(rows))
+        for (row, row_of_transitions) in enumerate(rows):
+            for (column, trans) in enumerate(row_of_transitions):
+                if trans is not None:
+                    self._set(row, column, trans)
+
+    @classmethod
+    def from_edges(cls, size, edges, numeric=EXACT,
+                   tolerance=DEFAULT_TOLERANCE, check_rows=True):
+        """Returns matrix built from ``(row, column, probability, resource)``
+        edges of the matrix with ``size`` vertices.
+
+        If ``size`` is None the matrix grows up to the largest vertex index.
+        ``check_rows`` switches off checks of sums of probabilities for
+        parts of a model whose rows are incomplete.
+        """
+        if numeric not in (EXACT, FLOAT):
+            raise MatrixInitError('unknown numeric mode', numeric)
+        row_tolerance = tolerance if numeric == FLOAT else None
+        matrix = cls.__new__(cls)
+        matrix.numeric = numeric
+        matrix._init_storage(size or 0)
+        for (row, column, probability, resource) in edges:
+            if row < 0 or column < 0 or (
+                    size is not None and (row >= size or column >= size)):
+                raise MatrixInitError('vertex index is out of range',
+                                      (row, column))
+            if size is None:
+                matrix._grow(max(row, column) + 1)
+            if column in matrix._out[row]:
+                raise MatrixInitError('transition is defined twice',
+                                      (row, column))
+            trans = Transition(probability, resource)
+            if numeric == FLOAT:
+                to_float(trans)
+            matrix._set(row, column, trans)
+        for row_of_transitions in matrix._out if check_rows else ():
+            if not check_sum_of_probabilities(row_of_transitions.values(),
+                                              row_tolerance):
+                raise MatrixInitError(
+                    'sum of probabilities has to be equal to zero or one',
+                    row_of_transitions
+                )
+        return matrix
+
+    def _init_storage(self, size):
+        self._vertices = list(range(size))
+        self._out = [{} for _ in self._vertices]
+        self._in = [{} for _ in self._vertices]
+        self._loops = set()
+
+    def _grow(self, size):
+        for vertex in range(len(self._vertices), size):
+            self._vertices.append(vertex)
+            self._out.append({})
+            self._in.append({})
+
+    def __repr__(self):
+        size = len(self)
+        return repr([[self.transition(row, column) for column in range(size)]
+                     for row in range(size)])
+
+    def __len__(self):
+        return len(self._vertices)
+
+    def transition(self, row, column):
+        """Returns transition from ``row`` vertex to ``column`` vertex."""
+        return self._out[self._vertices[row]].get(self._vertices[column])
+
+    def has_only_source_and_drain(self):
+        """Returns True if matrix has got only source and drain."""
+        return len(self._vertices) == 2 and not self._loops
+
+    def loop_exists(self):
+        """Returns True if loop exists in transition matrix."""
+        return bool(self._loops)
+
+    def exclude_first_loop(self):
+        """Excludes loop from transition matrix.
+
+        Returns ``Exclusion`` of the loop.
+        """
+        if not self._loops:
+            raise LoopExcludeError('loop does not found')
+        return self.exclude_loop(
+            bisect_left(self._vertices, min(self._loops)))
+
+    def exclude_loop(self, index):
+        """Excludes loop of ``index`` vertex leaving other loops as they are.
+
+        Returns ``Exclusion`` of the loop.
+        """
+        vertex = self._vertices[index]
+        if vertex not in self._loops:
+            raise LoopExcludeError('loop does not found', index)
+        loop = self._delete(vertex, vertex)
+        for trans in self._out[vertex].values():
+            update_trans_while_excluding_loop(trans, loop)
+        return Exclusion(index, len(self._out[vertex]), 0)
+
+    def exclude_last_vertex(self):
+        """Excludes last vertex from transition matrix.
+
+        Returns ``Exclusion`` of the vertex.
+        """
+        return self.exclude_vertex(len(self._vertices) - 1)
+
+    def exclude_vertex(self, index):
+        """Excludes ``index`` vertex from transition matrix.
+
+        Returns ``Exclusion`` of the vertex.
+        """
+        vertex = self._vertices[index]
+        column_items = [(row, trans) for (row, trans)
+                        in self._in[vertex].items() if row != vertex]
+        row_items = [(column, trans) for (column, trans)
+                     in self._out[vertex].items() if column != vertex]
+        created = 0
+        for (row, column_trans) in column_items:
+            row_of_transitions = self._out[row]
+            for (column, row_trans) in row_items:
+                host_cell = row_of_transitions.get(column)
+                if host_cell is None:
+                    created += 1
+                    self._set(row, column,
+                              transform_trans_while_excluding_vertex(
+                                  column_trans, row_trans))
+                else:
+                    update_trans_while_excluding_vertex(
+                        column_trans, row_trans, host_cell)
+
+        self.remove_vertex(index)
+        return Exclusion(index, len(column_items) * len(row_items), created)
+
+    def remove_vertex(self, index):
+        """Removes ``index`` vertex with its transitions, paths through the
+        vertex are lost.
+        """
+        vertex = self._vertices[index]
+        for row in self._in[vertex]:
+            del self._out[row][vertex]
+        for column in self._out[vertex]:
+            del self._in[column][vertex]
+        self._out[vertex] = self._in[vertex] = None
+        self._loops.discard(vertex)
+        del self._vertices[index]
+
+    def iter_transitions(self):
+        """Yields ``(row, column, transition)`` of non-empty cells."""
+        for (row, vertex) in enumerate(self._vertices):
+            for (column_vertex, trans) in sorted(self._out[vertex].items()):
+                yield row, bisect_left(self._vertices, column_vertex), trans
+
+    def _index_of_first_loop(self):
+        """Returns index of first loop in transition matrix."""
+        if self._loops:
+            return bisect_left(self._vertices, min(self._loops))
+
+    def _set(self, row, column, trans):
+        self._out[row][column] = trans
+        self._in[column][row] = trans
+        if row == column:
+            self._loops.add(row)
+
+    def _delete(self, row, column):
+        del self._in[column][row]
+        if row == column:
+            self._loops.discard(row)
+        return self._out[row].pop(column)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import os
+import struct
+
+import numpy as np
+
+from .core import reduce_matrix_size
+from .dense import DenseTransitionMatrix
+from .exceptions import MatrixInitError
+from .observers import VERTEX
+
+MAGIC = b'BEIZER\x00\x00'
+VERSION = 1
+# Magic, version and number of vertices padded to 64 bytes, so the planes
+# are aligned for memory mapping.
+_HEADER = struct.Struct('<8sIQ')
+HEADER_SIZE = 64
+
+
+def save(transition_matrix, path):
+    """Saves matrix of any backend to binary file.
+
+    The file holds a header, float64 planes of probabilities and resources
+    and a plane of occupancy. Values are stored as float64. The file is
+    replaced atomically, so a checkpoint is never left half-written.
+    """
+    size = len(transition_matrix)
+    if isinstance(transition_matrix, DenseTransitionMatrix):
+        probability = transition_matrix._probability
+        resource = transition_matrix._resource
+        occupancy = transition_matrix._occupancy
+    else:
+        probability = np.zeros((size, size))
+        resource = np.zeros((size, size))
+        occupancy = np.zeros((size, size), dtype=bool)
+        for (row, column, trans) in transition_matrix.iter_transitions():
+            probability[row, column] = trans.probability
+            resource[row, column] = trans.resource
+            occupancy[row, column] = True
+
+    tmp_path = '{0}.tmp'.format(path)
+    with open(tmp_path, 'wb') as matrix_file:
+        header = _HEADER.pack(MAGIC, VERSION, size)
+        matrix_file.write(header.ljust(HEADER_SIZE, b'\x00'))
+        for (plane, dtype) in ((probability, '<f8'), (resource, '<f8'),
+                               (occupancy, np.bool_)):
+            matrix_file.write(np.ascontiguousarray(plane, dtype).tobytes())
+    os.replace(tmp_path, path)
+
+
+def load(path, mmap=True):
+    """Returns ``DenseTransitionMatrix`` loaded from binary file.
+
+    With ``mmap`` the planes are memory mapped copy-on-write: nothing is
+    parsed and reduction of the matrix does not change the file.
+    """
+    with open(path, 'rb') as matrix_file:
+        header = matrix_file.read(HEADER_SIZE)
+    if len(header) < _HEADER.size:
+        raise MatrixInitError('file is too short', path)
+    (magic, version, size) = _HEADER.unpack_from(header)
+    if magic != MAGIC:
+        raise MatrixInitError('file is not a beizer matrix', path)
+    if version != VERSION:
+        raise MatrixInitError('unsupported version', version)
+    plane_size = size * size * 8
+    expected_size = HEADER_SIZE + 2 * plane_size + size * size
+    if os.path.getsize(path) != expected_size:
+        raise MatrixInitError('file size does not match header', path)
+
+    planes = []
+    offset = HEADER_SIZE
+    for dtype in ('<f8', '<f8', np.bool_):
+        if mmap:
+            plane = np.memmap(path, dtype=dtype, mode='c', offset=offset,
+                              shape=(size, size))
+        else:
+            plane = np.fromfile(path, dtype=dtype, count=size * size,
+                                offset=offset).reshape((size, size))
+        planes.append(plane)
+        offset += size * size * np.dtype(dtype).itemsize
+    return DenseTransitionMatrix.from_arrays(*planes)
+
+
+def reduce_with_checkpoints(transition_matrix, path, every=1):
+    """Reduces matrix like ``reduce_matrix_size`` and saves checkpoints.
+
+    The matrix is saved to ``path`` after every ``every`` excluded
+    vertices and when it is reduced. To resume a killed run load the
+    checkpoint and pass it here again. Returns number of transitions created.
+    """
+    excluded = [0]
+
+    def checkpoint(event):
+        if event.kind == VERTEX:
+            excluded[0] += 1
+            if excluded[0] % every == 0:
+                save(transition_matrix, path)
+
+    created = reduce_matrix_size(transition_matrix, observer=checkpoint)
+    save(transition_matrix, path)
+    return created
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+from .core import reduce_to_vertices
+from .models import EXACT, Transition
+from .sparse import SparseTransitionMatrix
+from .utils import DRAIN, SOURCE
+
+
+def reduce_topologically(transition_matrix):
+    """Returns transition from source to drain found in topological order.
+
+    Strongly connected components of vertices reachable from source are
+    visited starting from the ones next to drain. Vertex without loop
+    which is a component by itself takes probability ``h`` of reaching
+    drain and resource ``g`` spent on the way weighted by that probability
+    from its successors:
+
+        h[v] = sum(p * h[w]),  g[v] = sum(p * (r * h[w] + g[w])).
+
+    So an acyclic model costs O(V + E). A cyclic component is reduced once
+    by ``reduce_to_vertices`` to its vertices entered from outside and a
+    virtual drain which transitions leaving the component go to. Entered
+    vertices are then excluded one by one and their ``h`` and ``g`` are
+    found in reverse order of exclusion.
+
+    Keyword arguments:
+    transition_matrix -- matrix of any backend, it is not changed.
+
+    Returns None if drain is not reachable.
+    """
+    successors = [[] for _ in range(len(transition_matrix))]
+    for (row, column, trans) in transition_matrix.iter_transitions():
+        if row != DRAIN:
+            successors[row].append((column, trans))
+    numeric = getattr(transition_matrix, 'numeric', EXACT)
+
+    components = strongly_connected_components(successors, SOURCE)
+    component_of = {}
+    for (index, component) in enumerate(components):
+        for vertex in component:
+            component_of[vertex] = index
+    entered = set([SOURCE])
+    for (vertex, index) in component_of.items():
+        for (column, _) in successors[vertex]:
+            if component_of[column] != index:
+                entered.add(column)
+
+    h = {DRAIN: 1}
+    g = {DRAIN: 0}
+    for component in components:
+        vertex = component[0]
+        if len(component) > 1 or any(column == vertex for (column, _)
+                                     in successors[vertex]):
+            _reduce_component(component, successors, entered, h, g, numeric)
+        elif vertex != DRAIN:
+            (h[vertex], g[vertex]) = _leave(successors[vertex], h, g)
+
+    if not h[SOURCE]:
+        return None
+    return Transition(probability=h[SOURCE], resource=g[SOURCE] / h[SOURCE])
+
+
+def strongly_connected_components(successors, start):
+    """Returns strongly connected components of vertices reachable from
+    ``start`` in reverse topological order.
+
+    ``successors`` holds ``(column, transition)`` pairs of every vertex.
+    Tarjan's algorithm is run without recursion, so long chains do not hit
+    recursion limit.
+    """
+    index = {start: 0}
+    lowlink = {start: 0}
+    stack = [start]
+    on_stack = set(stack)
+    components = []
+    work = [(start, iter(successors[start]))]
+    while work:
+        (vertex, columns) = work[-1]
+        for (column, _) in columns:
+            if column not in index:
+                index[column] = lowlink[column] = len(index)
+                stack.append(column)
+                on_stack.add(column)
+                work.append((column, iter(successors[column])))
+                break
+            if column in on_stack:
+                lowlink[vertex] = min(lowlink[vertex], index[column])
+        else:
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[vertex])
+            if lowlink[vertex] == index[vertex]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == vertex:
+                        break
+                components.append(component)
+    return components
+
+
+def _leave(row_successors, h, g, members=()):
+    """Returns ``h`` and ``g`` of transitions leaving ``members``."""
+    probability = 0
+    resource = 0
+    for (column, trans) in row_successors:
+        if column not in members and h[column]:
+            probability += trans.probability * h[column]
+            resource += trans.probability * (
+                trans.resource * h[column] + g[column])
+    return probability, resource
+
+
+def _reduce_component(component, successors, entered, h, g, numeric):
+    """Finds ``h`` and ``g`` of vertices of the component entered from
+    outside.
+
+    Leaving transitions of every vertex are merged into one transition to
+    a virtual drain.
+    """
+    members = frozenset(component)
+    edges = []
+    for vertex in component:
+        for (column, trans) in successors[vertex]:
+            if column in members:
+                edges.append((vertex, column, trans.probability,
+                              trans.resource))
+        (probability, resource) = _leave(successors[vertex], h, g, members)
+        if probability:
+            edges.append((vertex, None, probability, resource / probability))
+
+    if all(column in members for (_, column, _, _) in edges):
+        # Drain is not reachable from the component.
+        for vertex in component:
+            h[vertex] = g[vertex] = 0
+        return
+
+    # The first entry and virtual drain take places of source and drain,
+    # other entries follow them and the rest of vertices are excluded.
+    entries = [vertex for vertex in component if vertex in entered]
+    local_index = {entries[0]: SOURCE, None: DRAIN}
+    for vertex in entries[1:] + component:
+        local_index.setdefault(vertex, len(local_index))
+    local_matrix = SparseTransitionMatrix.from_edges(
+        len(local_index),
+        [(local_index[row], local_index[column], probability, resource)
+         for (row, column, probability, resource) in edges],
+        numeric, check_rows=False)
+    reduce_to_vertices(local_matrix, range(len(entries) + 1))
+
+    # Transitions of an excluded entry go to entries excluded after it and
+    # virtual drain, so its ``h`` and ``g`` are known once theirs are.
+    exits = []
+    for index in list(range(len(local_matrix) - 1, DRAIN, -1)) + [SOURCE]:
+        if local_matrix.transition(index, index) is not None:
+            local_matrix.exclude_loop(index)
+        columns = range(index) if index != SOURCE else [DRAIN]
+        exits.append((index, [
+            (column, local_matrix.transition(index, column))
+            for column in columns
+            if local_matrix.transition(index, column) is not None]))
+        if index != SOURCE:
+            local_matrix.exclude_vertex(index)
+
+    local_h = {DRAIN: 1}
+    local_g = {DRAIN: 0}
+    for (index, row_successors) in reversed(exits):
+        (local_h[index], local_g[index]) = _leave(row_successors, local_h,
+                                                  local_g)
+    for entry in entries:
+        h[entry] = local_h[local_index[entry]]
+        g[entry] = local_g[local_index[entry]]
@@ -1,4 +1,9 @@
 # -*- coding: utf-8 -*-
+from collections import deque
+
+# Indices of source and drain vertices of a model.
+SOURCE = 0
+DRAIN = 1
 
 
 def matrix_is_quadratic(matrix):
@@ -12,13 +17,36 @@ def matrix_is_quadratic(matrix):
         return quadratic
 
 
+def column_of_matrix(matrix, index):
+    """Returns column of quadratic matrix."""
+    return [row[index] for row in matrix]
+
+
 def last_column_of_matrix(matrix):
     """Returns last column of quadratic matrix."""
-    index_of_last_column = len(matrix) - 1
-    return [row[index_of_last_column] for row in matrix]
+    return column_of_matrix(matrix, len(matrix) - 1)
 
 
 def last_row_of_matrix(matrix):
     """Returns last row of quadratic matrix."""
     index_of_last_row = len(matrix) - 1
     return matrix[index_of_last_row]
+
+
+def distance_order(predecessors):
+    """Returns vertices from which drain is reachable except drain itself
+    in order of distance to drain.
+
+    ``predecessors`` holds lists of predecessors of every vertex.
+    """
+    distance = {DRAIN: 0}
+    queue = deque([DRAIN])
+    order = []
+    while queue:
+        vertex = queue.popleft()
+        for row in predecessors[vertex]:
+            if row not in distance:
+                distance[row] = distance[vertex] + 1
+                order.append(row)
+                queue.append(row)
+    return order
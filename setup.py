@@ -1,5 +1,5 @@
 #!/usr/bin/env python
-from distutils.core import setup
+from setuptools import setup
 
 setup(
     name='beizer',
@@ -9,5 +9,12 @@ setup(
     author_email='marselester@ya.ru',
     url='https://github.com/marselester/beizer/',
     description="Illustration of Boris Beizer's algorithm",
-    long_description=open('README.rst').read()
+    long_description=open('README.rst').read(),
+    python_requires='>=3.8',
+    extras_require={
+        # Dense backend, batches, linear solver, Monte Carlo and storage.
+        'numpy': ['numpy'],
+        # Sparse LU of the linear solver.
+        'scipy': ['numpy', 'scipy'],
+    },
 )
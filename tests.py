@@ -1,17 +1,77 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import io
+import json
+import os
+import shutil
+import signal
+import tempfile
+import threading
 import unittest
 from decimal import Decimal as D
+from fractions import Fraction as F
 
-from beizer.models import (TransitionMatrix, Transition,
+from beizer.models import (EXACT, FLOAT, TransitionMatrix, Transition,
                            transform_trans_while_excluding_vertex,
                            transform_trans_while_excluding_loop,
+                           update_trans_while_excluding_vertex,
+                           update_trans_while_excluding_loop,
                            check_sum_of_probabilities)
-from beizer.exceptions import MatrixInitError, LoopExcludeError
-from beizer.core import reduce_matrix_size
+from beizer.exceptions import (MatrixInitError, MatrixReduceError,
+                               LoopExcludeError)
+from beizer.core import reduce_matrix_size, reduce_many, reduce_to_vertices
+from beizer.sparse import SparseTransitionMatrix
+from beizer.ordering import MINIMUM_DEGREE, MINIMUM_FILL
+from beizer.plan import compile_plan, split_matrix
+from beizer.loaders import load_edges, CSV, JSON_LINES
+from beizer.partition import partition, reduce_partitioned
+from beizer.simplify import simplify
+from beizer.cache import ReductionCache, matrix_key
+from beizer.sensitivity import sensitivities
+from beizer.iterative import solve_iteratively
+from beizer.service import ReductionService
+from beizer.topological import (reduce_topologically,
+                                strongly_connected_components)
+from beizer import benchmarks
+from beizer.observers import LOOP, VERTEX, ReductionStatistics
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+else:
+    from beizer.dense import DenseTransitionMatrix, reduce_batch
+    from beizer.linalg import solve_source_to_drain
+    from beizer.montecarlo import estimate, _compressed_rows
+    from beizer import storage
+
+try:
+    import scipy
+except ImportError:
+    scipy = None
 
 _ = None
 
 
+def four_vertices_with_one_loop():
+    return [
+        [_, _, (D('0.4'), D('10')), (D('0.6'), D('20'))],
+        [_, _, _, _],
+        [_, (D('0.4'), D('10')), (D('0.2'), D('5')), (D('0.4'), D('15'))],
+        [_, (D('0.8'), D('5')), (D('0.2'), D('10')), _],
+    ]
+
+
+def five_vertices_with_four_loops():
+    return [
+        [(D('0.15'), D('56')), _, (D('0.85'), D('112')), _, _],
+        [_, _, _, _, _],
+        [_, _, (D('0.05'), D('8')), (D('0.95'), D('16')), _],
+        [_, _, _, (D('0.05'), D('24')), (D('0.95'), D('48'))],
+        [_, (D('0.90'), D('40')), _, _, (D('0.10'), D('20'))],
+    ]
+
+
 class MatrixInitTest(unittest.TestCase):
 
     def test_init_takes_at_least_two_arguments(self):
@@ -277,6 +337,29 @@ class TransformTransitionWhileExcludingVertexTest(unittest.TestCase):
         self.assertEqual(intersection, expected_intersection)
 
 
+class UpdateTransitionInPlaceTest(unittest.TestCase):
+
+    def test_loop_update_gives_same_values(self):
+        trans = Transition(D('0.4'), D('10'))
+        loop = Transition(D('0.2'), D('5'))
+        expected = transform_trans_while_excluding_loop(trans, loop)
+        update_trans_while_excluding_loop(trans, loop)
+        self.assertEqual(trans, expected)
+
+    def test_vertex_update_gives_same_values(self):
+        column_trans = Transition(D('0.6'), D('8'))
+        row_trans = Transition(D('0.2'), D('2'))
+        host_cell = Transition(D('0.4'), D('10'))
+        expected = transform_trans_while_excluding_vertex(
+            column_trans, row_trans, host_cell)
+        update_trans_while_excluding_vertex(column_trans, row_trans,
+                                            host_cell)
+        self.assertEqual(host_cell, expected)
+
+    def test_transition_has_not_got_dict(self):
+        self.assertFalse(hasattr(Transition(1, 2), '__dict__'))
+
+
 class ReduceMatrixSizeTest(unittest.TestCase):
 
     def test_matrix_has_one_loop_and_four_vertices(self):
@@ -340,5 +423,1200 @@ class ReduceMatrixSizeTest(unittest.TestCase):
         )
         self.assertTrue(all_rows_are_ok_after_excluding_first_loop)
 
+    def test_source_loop_appears_at_the_last_step(self):
+        trans_matrix = TransitionMatrix([
+            [_, _, (1, 3)],
+            [_, _, _],
+            [(D('0.5'), 2), (D('0.5'), 4), _],
+        ])
+        reduce_matrix_size(trans_matrix)
+        self.assertTrue(trans_matrix.has_only_source_and_drain())
+        # Probability is 0.5 / (1 - 0.5) = 1
+        # Resource is 7 + (5 * 0.5) / (1 - 0.5) = 12
+        self.assertEqual(trans_matrix.transition(0, 1), Transition(1, 12))
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class DenseTransitionMatrixTest(unittest.TestCase):
+
+    def assertTransitionAlmostEqual(self, first, second):
+        self.assertAlmostEqual(float(first.probability),
+                               float(second.probability))
+        self.assertAlmostEqual(float(first.resource), float(second.resource))
+
+    def test_repr(self):
+        matrix = [
+            [(D('0.6'), 10), (D('0.4'), 7)],
+            [_, _]
+        ]
+        self.assertEqual(repr(DenseTransitionMatrix(matrix)),
+                         '[[(P=0.6, R=10.0), (P=0.4, R=7.0)], [None, None]]')
+
+    def test_sum_of_probabilities_is_not_equal_to_one(self):
+        matrix = [
+            [(D('0.6'), 10), (D('0.39'), 7)],
+            [_, _]
+        ]
+        self.assertRaises(MatrixInitError, DenseTransitionMatrix, (matrix))
+
+    def test_matrix_2x2_has_not_got_loop(self):
+        trans_matrix = DenseTransitionMatrix([[_, (1, 7)], [_, _]])
+        self.assertRaises(LoopExcludeError, trans_matrix.exclude_first_loop)
+
+    def test_matrix_2x2_source_has_loop(self):
+        trans_matrix = DenseTransitionMatrix([
+            [(D('0.6'), 10), (D('0.4'), 7)],
+            [_, _]
+        ])
+        trans_matrix.exclude_first_loop()
+        self.assertTrue(trans_matrix.has_only_source_and_drain())
+        self.assertTransitionAlmostEqual(trans_matrix.transition(0, 1),
+                                         Transition(1, 22))
+
+    def test_exclude_last_vertex_gives_same_cells(self):
+        matrix = [
+            [_, _, (D('0.4'), D('10')), (D('0.6'), D('20'))],
+            [_, _, _, _],
+            [_, (D('0.5'), D('10')), _, (D('0.5'), D('15'))],
+            [_, (D('0.8'), D('5')), (D('0.2'), D('10')), _],
+        ]
+        expected = TransitionMatrix(matrix)
+        expected.exclude_last_vertex()
+        trans_matrix = DenseTransitionMatrix(matrix)
+        trans_matrix.exclude_last_vertex()
+
+        self.assertEqual(len(trans_matrix), 3)
+        for row in range(3):
+            for column in range(3):
+                trans = trans_matrix.transition(row, column)
+                expected_trans = expected.transition(row, column)
+                if expected_trans is None:
+                    self.assertTrue(trans is None)
+                else:
+                    self.assertTransitionAlmostEqual(trans, expected_trans)
+
+    def test_reduce_matrix_size_gives_same_result(self):
+        for src_matrix in (four_vertices_with_one_loop(),
+                           five_vertices_with_four_loops()):
+            expected = TransitionMatrix(src_matrix)
+            reduce_matrix_size(expected)
+            trans_matrix = DenseTransitionMatrix(src_matrix)
+            reduce_matrix_size(trans_matrix)
+
+            self.assertTrue(trans_matrix.has_only_source_and_drain())
+            self.assertTransitionAlmostEqual(trans_matrix.transition(0, 1),
+                                             expected.transition(0, 1))
+
+
+class SparseTransitionMatrixTest(unittest.TestCase):
+
+    def test_matrix_is_not_quadratic(self):
+        matrix = [
+            [(0.6, 10), _],
+            [_]
+        ]
+        self.assertRaises(MatrixInitError, SparseTransitionMatrix, (matrix))
+
+    def test_repr_is_the_same(self):
+        src_matrix = four_vertices_with_one_loop()
+        self.assertEqual(repr(SparseTransitionMatrix(src_matrix)),
+                         repr(TransitionMatrix(src_matrix)))
+
+    def test_from_edges(self):
+        edges = [
+            (0, 2, D('0.4'), D('10')), (0, 3, D('0.6'), D('20')),
+            (2, 1, D('0.4'), D('10')), (2, 2, D('0.2'), D('5')),
+            (2, 3, D('0.4'), D('15')),
+            (3, 1, D('0.8'), D('5')), (3, 2, D('0.2'), D('10')),
+        ]
+        trans_matrix = SparseTransitionMatrix.from_edges(4, edges)
+        self.assertEqual(repr(trans_matrix),
+                         repr(TransitionMatrix(four_vertices_with_one_loop())))
+
+    def test_from_edges_checks_sum_of_probabilities(self):
+        edges = [(0, 1, D('0.6'), 10), (0, 0, D('0.39'), 7)]
+        self.assertRaises(MatrixInitError,
+                          SparseTransitionMatrix.from_edges, 2, edges)
+
+    def test_exclude_steps_give_same_cells(self):
+        src_matrix = five_vertices_with_four_loops()
+        expected = TransitionMatrix(src_matrix)
+        trans_matrix = SparseTransitionMatrix(src_matrix)
+        while not expected.has_only_source_and_drain():
+            while expected.loop_exists():
+                self.assertTrue(trans_matrix.loop_exists())
+                expected.exclude_first_loop()
+                trans_matrix.exclude_first_loop()
+                self.assertEqual(repr(trans_matrix), repr(expected))
+            self.assertFalse(trans_matrix.loop_exists())
+            expected.exclude_last_vertex()
+            trans_matrix.exclude_last_vertex()
+            self.assertEqual(repr(trans_matrix), repr(expected))
+        self.assertTrue(trans_matrix.has_only_source_and_drain())
+
+    def test_reduce_matrix_size(self):
+        trans_matrix = SparseTransitionMatrix(five_vertices_with_four_loops())
+        reduce_matrix_size(trans_matrix)
+        self.assertTrue(trans_matrix.has_only_source_and_drain())
+        self.assertEqual(trans_matrix.transition(0, 1).probability, D('1'))
+
+
+class EliminationOrderTest(unittest.TestCase):
+
+    def hub_with_leaves(self):
+        # Hub is the last vertex, every leaf goes to drain or back to hub.
+        a = (F(1), F(2))
+        b = (F(1, 4), F(3))
+        c = (F(1, 2), F(5))
+        d = (F(1, 2), F(7))
+        return [
+            [_, _, _, _, _, _, a],
+            [_, _, _, _, _, _, _],
+            [_, c, _, _, _, _, d],
+            [_, c, _, _, _, _, d],
+            [_, c, _, _, _, _, d],
+            [_, c, _, _, _, _, d],
+            [_, _, b, b, b, b, _],
+        ]
+
+    def test_strategies_give_same_result(self):
+        expected = TransitionMatrix(self.hub_with_leaves())
+        reduce_matrix_size(expected)
+        for order in (MINIMUM_DEGREE, MINIMUM_FILL, [2, 3, 4, 5, 6]):
+            for matrix_class in (TransitionMatrix, SparseTransitionMatrix):
+                trans_matrix = matrix_class(self.hub_with_leaves())
+                reduce_matrix_size(trans_matrix, order=order)
+                self.assertTrue(trans_matrix.has_only_source_and_drain())
+                self.assertEqual(trans_matrix.transition(0, 1),
+                                 expected.transition(0, 1))
+
+    def test_heuristics_create_less_transitions(self):
+        created_by_last_vertex = reduce_matrix_size(
+            TransitionMatrix(self.hub_with_leaves()))
+        created_by_degree = reduce_matrix_size(
+            TransitionMatrix(self.hub_with_leaves()), order=MINIMUM_DEGREE)
+        created_by_fill = reduce_matrix_size(
+            SparseTransitionMatrix(self.hub_with_leaves()), order=MINIMUM_FILL)
+        self.assertEqual(created_by_last_vertex, 27)
+        self.assertEqual(created_by_degree, 6)
+        self.assertEqual(created_by_fill, 6)
+
+    def test_order_must_not_exclude_source_or_drain(self):
+        trans_matrix = TransitionMatrix(self.hub_with_leaves())
+        self.assertRaises(MatrixReduceError, reduce_matrix_size,
+                          trans_matrix, [1, 2, 3, 4, 5, 6])
+        self.assertRaises(MatrixReduceError, reduce_matrix_size,
+                          trans_matrix, [2, 3, 4, 5])
+
+
+class EliminationPlanTest(unittest.TestCase):
+
+    def test_plan_gives_same_result_as_reduction(self):
+        src_matrix = five_vertices_with_four_loops()
+        (size, edges, values) = split_matrix(TransitionMatrix(src_matrix))
+        for order in (None, MINIMUM_DEGREE):
+            plan = compile_plan(size, edges, order)
+            for scale in (D('1'), D('0.5'), D('3')):
+                new_values = [(probability, resource * scale)
+                              for (probability, resource) in values]
+                new_matrix = [[_] * size for _ in range(size)]
+                for ((row, column), value) in zip(edges, new_values):
+                    new_matrix[row][column] = value
+                trans_matrix = TransitionMatrix(new_matrix)
+                reduce_matrix_size(trans_matrix, order=order)
+
+                self.assertEqual(plan.run(new_values),
+                                 trans_matrix.transition(0, 1))
+
+    def test_plan_is_cached(self):
+        (size, edges, _values) = split_matrix(
+            TransitionMatrix(four_vertices_with_one_loop()))
+        self.assertTrue(compile_plan(size, edges) is
+                        compile_plan(size, list(edges)))
+        self.assertFalse(compile_plan(size, edges) is
+                         compile_plan(size, edges, MINIMUM_FILL))
+
+    def test_wrong_number_of_values(self):
+        plan = compile_plan(2, [(0, 1)])
+        self.assertRaises(ValueError, plan.run, [])
+        self.assertEqual(plan.run([(1, 7)]), Transition(1, 7))
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class ReduceBatchTest(unittest.TestCase):
+
+    def batch_of(self, src_matrices):
+        size = len(src_matrices[0])
+        probability = numpy.zeros((len(src_matrices), size, size))
+        resource = numpy.zeros((len(src_matrices), size, size))
+        for (item, src_matrix) in enumerate(src_matrices):
+            for (row, row_src) in enumerate(src_matrix):
+                for (column, cell) in enumerate(row_src):
+                    if cell is not None:
+                        probability[item, row, column] = cell[0]
+                        resource[item, row, column] = cell[1]
+        return probability, resource
+
+    def scaled_matrices(self):
+        src_matrices = []
+        for scale in (1, 2, 5):
+            src_matrix = five_vertices_with_four_loops()
+            src_matrices.append([
+                [cell if cell is None else (cell[0], cell[1] * scale)
+                 for cell in row] for row in src_matrix
+            ])
+        return src_matrices
+
+    def test_batch_gives_same_results(self):
+        src_matrices = self.scaled_matrices()
+        (probability, resource) = self.batch_of(src_matrices)
+        for order in (None, MINIMUM_DEGREE):
+            (result_probability, result_resource) = reduce_batch(
+                probability, resource, order=order)
+            for (item, src_matrix) in enumerate(src_matrices):
+                trans_matrix = TransitionMatrix(src_matrix)
+                reduce_matrix_size(trans_matrix)
+                expected = trans_matrix.transition(0, 1)
+                self.assertAlmostEqual(result_probability[item],
+                                       float(expected.probability))
+                self.assertAlmostEqual(result_resource[item],
+                                       float(expected.resource))
+
+    def test_input_arrays_are_not_changed(self):
+        (probability, resource) = self.batch_of(self.scaled_matrices())
+        probability_copy = probability.copy()
+        reduce_batch(probability, resource)
+        self.assertTrue((probability == probability_copy).all())
+
+    def test_cells_with_zero_probability_in_some_matrices(self):
+        probability = numpy.zeros((2, 4, 4))
+        resource = numpy.zeros((2, 4, 4))
+        probability[0, 0, 2] = probability[0, 0, 3] = 0.5
+        probability[1, 0, 2] = 1
+        probability[:, 2, 1] = probability[:, 3, 1] = 1
+        resource[:, 0, 2] = 1
+        resource[:, 0, 3] = 5
+        resource[:, 2, 1] = 3
+        resource[:, 3, 1] = 3
+        (probabilities, resources) = reduce_batch(probability, resource)
+        self.assertEqual(list(probabilities), [1, 1])
+        self.assertEqual(list(resources), [6, 4])
+
+    def test_wrong_shape(self):
+        self.assertRaises(ValueError, reduce_batch,
+                          numpy.zeros((2, 2)), numpy.zeros((2, 2)))
+
+
+class ReduceManyTest(unittest.TestCase):
+
+    def test_results_are_in_input_order(self):
+        models = [
+            four_vertices_with_one_loop(),
+            [[_, (1, 7)], [_, _]],
+            TransitionMatrix(five_vertices_with_four_loops()),
+        ]
+        results = reduce_many(models, processes=2, numeric=EXACT)
+
+        expected = []
+        for src_matrix in (four_vertices_with_one_loop(),
+                           [[_, (1, 7)], [_, _]],
+                           five_vertices_with_four_loops()):
+            trans_matrix = TransitionMatrix(src_matrix)
+            reduce_matrix_size(trans_matrix)
+            expected.append(trans_matrix.transition(0, 1))
+        self.assertEqual(results, expected)
+
+    def test_malformed_model_does_not_fail_batch(self):
+        models = [
+            [[(D('0.6'), 10), (D('0.39'), 7)], [_, _]],
+            [[_, (1, 7)], [_]],
+            'some wrong value',
+            [[_, ('x', 1)], [_, _]],
+            [[_, (1, 2, 3)], [_, _]],
+            [[_, (1, 7)], [_, _]],
+        ]
+        for numeric in (FLOAT, EXACT):
+            results = reduce_many(models, processes=2, chunksize=2,
+                                  numeric=numeric)
+            for result in results[:5]:
+                self.assertTrue(isinstance(result, MatrixInitError))
+            self.assertEqual(results[5], Transition(1, 7))
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class SolveSourceToDrainTest(unittest.TestCase):
+
+    def assert_same_as_reduction(self, src_matrix, sparse):
+        trans_matrix = TransitionMatrix(src_matrix)
+        trans = solve_source_to_drain(trans_matrix, sparse=sparse)
+        reduce_matrix_size(trans_matrix)
+        expected = trans_matrix.transition(0, 1)
+        self.assertAlmostEqual(trans.probability, float(expected.probability))
+        self.assertAlmostEqual(trans.resource, float(expected.resource))
+
+    def test_dense_solver(self):
+        self.assert_same_as_reduction(four_vertices_with_one_loop(), False)
+        self.assert_same_as_reduction(five_vertices_with_four_loops(), False)
+
+    @unittest.skipIf(scipy is None, 'scipy is not installed')
+    def test_sparse_solver(self):
+        self.assert_same_as_reduction(four_vertices_with_one_loop(), True)
+        self.assert_same_as_reduction(five_vertices_with_four_loops(), True)
+
+    def test_drain_is_not_reachable(self):
+        trans_matrix = TransitionMatrix([
+            [_, _, (1, 3)],
+            [_, _, _],
+            [_, _, _],
+        ])
+        self.assertTrue(solve_source_to_drain(trans_matrix) is None)
+
+    def test_closed_loop_does_not_reach_drain(self):
+        trans_matrix = TransitionMatrix([
+            [_, _, (1, 3)],
+            [_, _, _],
+            [_, _, (1, 2)],
+        ])
+        self.assertTrue(solve_source_to_drain(trans_matrix, False) is None)
+
+    def test_closed_cycle_is_left_out(self):
+        src_matrix = [
+            [_, (D('0.5'), 1), (D('0.5'), 2), _],
+            [_, _, _, _],
+            [_, _, _, (1, 3)],
+            [_, _, (1, 4), _],
+        ]
+        self.assert_same_as_reduction(src_matrix, False)
+        if scipy is not None:
+            self.assert_same_as_reduction(src_matrix, True)
+        trans = solve_source_to_drain(TransitionMatrix(src_matrix), False)
+        self.assertAlmostEqual(trans.probability, 0.5)
+        self.assertAlmostEqual(trans.resource, 1.0)
+
+
+class LoopIndexTest(unittest.TestCase):
+
+    def test_diagonal_is_not_scanned_while_reducing(self):
+        # Source goes through a chain of vertices to drain, no loops appear.
+        size = 30
+        src_matrix = [[None] * size for _ in range(size)]
+        src_matrix[0][2] = (1, 1)
+        for vertex in range(2, size - 1):
+            src_matrix[vertex][vertex + 1] = (1, 1)
+        src_matrix[size - 1][1] = (1, 1)
+        trans_matrix = TransitionMatrix(src_matrix)
+        reduce_matrix_size(trans_matrix)
+        self.assertEqual(trans_matrix.transition(0, 1), Transition(1, 29))
+        self.assertEqual(trans_matrix.counters['diagonal_reads'], size)
+        self.assertTrue(trans_matrix.counters['loop_lookups'] > 0)
+
+    def test_diagonal_is_read_where_loops_change(self):
+        trans_matrix = TransitionMatrix([
+            [_, _, (1, 3)],
+            [_, _, _],
+            [(D('0.5'), 2), (D('0.5'), 4), _],
+        ])
+        self.assertEqual(trans_matrix.counters['diagonal_reads'], 3)
+        # Exclusion writes to the diagonal cell of source.
+        trans_matrix.exclude_last_vertex()
+        self.assertEqual(trans_matrix.counters['diagonal_reads'], 4)
+        trans_matrix.exclude_first_loop()
+        self.assertEqual(trans_matrix.counters['diagonal_reads'], 5)
+
+    def test_loop_created_by_vertex_exclusion(self):
+        trans_matrix = TransitionMatrix([
+            [_, _, (1, 3)],
+            [_, _, _],
+            [(D('0.5'), 2), (D('0.5'), 4), _],
+        ])
+        self.assertFalse(trans_matrix.loop_exists())
+        trans_matrix.exclude_last_vertex()
+        self.assertTrue(trans_matrix.loop_exists())
+        self.assertEqual(trans_matrix._index_of_first_loop(), 0)
+        trans_matrix.exclude_first_loop()
+        self.assertTrue(trans_matrix.has_only_source_and_drain())
+
+    def test_loops_are_shifted_when_vertex_is_excluded(self):
+        trans_matrix = TransitionMatrix(five_vertices_with_four_loops())
+        trans_matrix.exclude_first_loop()
+        trans_matrix.exclude_first_loop()
+        trans_matrix.exclude_vertex(2)
+        self.assertEqual(trans_matrix._index_of_first_loop(), 2)
+        self.assertTrue(trans_matrix.transition(2, 2) is not None)
+
+
+def entry_with_two_exits():
+    # Vertex 0 is entry, 1 is success and 4 is error exit.
+    return [
+        [_, _, (D('0.4'), 10), (D('0.6'), 20), _],
+        [_, _, _, _, _],
+        [_, (D('0.4'), 10), (D('0.2'), 5), (D('0.4'), 15), _],
+        [_, (D('0.3'), 5), (D('0.2'), 10), _, (D('0.5'), 7)],
+        [_, _, _, _, _],
+    ]
+
+
+class ReduceToVerticesTest(unittest.TestCase):
+
+    def reduce_to_exit(self, exit_vertex):
+        src_matrix = entry_with_two_exits()
+        # Swapping columns and rows of drain and exit makes exit a drain.
+        for row in src_matrix:
+            row[1], row[exit_vertex] = row[exit_vertex], row[1]
+        src_matrix[1], src_matrix[exit_vertex] = (src_matrix[exit_vertex],
+                                                  src_matrix[1])
+        trans_matrix = TransitionMatrix(src_matrix)
+        reduce_matrix_size(trans_matrix)
+        return trans_matrix.transition(0, 1)
+
+    def test_every_exit_in_one_pass(self):
+        for matrix_class in (TransitionMatrix, SparseTransitionMatrix):
+            trans_matrix = matrix_class(entry_with_two_exits())
+            reduced = reduce_to_vertices(trans_matrix, keep=[4, 0, 1])
+            self.assertEqual(len(trans_matrix), 3)
+            self.assertEqual(sorted(reduced), [(0, 1), (0, 4)])
+            self.assertEqual(reduced[(0, 1)], self.reduce_to_exit(1))
+            self.assertEqual(reduced[(0, 4)], self.reduce_to_exit(4))
+            self.assertEqual(
+                reduced[(0, 1)].probability + reduced[(0, 4)].probability, 1)
+
+    def test_order_strategy(self):
+        trans_matrix = TransitionMatrix(entry_with_two_exits())
+        reduced = reduce_to_vertices(trans_matrix, (0, 1, 4),
+                                     order=MINIMUM_FILL)
+        self.assertEqual(reduced[(0, 4)], self.reduce_to_exit(4))
+
+    def test_kept_vertices_have_to_be_in_matrix(self):
+        trans_matrix = TransitionMatrix(entry_with_two_exits())
+        self.assertRaises(MatrixReduceError, reduce_to_vertices,
+                          trans_matrix, (0, 5))
+        self.assertRaises(MatrixReduceError, reduce_to_vertices,
+                          trans_matrix, ())
+
+
+def exact_model(family, size):
+    (size, edges) = benchmarks.FAMILIES[family](size, seed=1)
+    return SparseTransitionMatrix.from_edges(
+        size, [(row, column, F(probability), F(resource))
+               for (row, column, probability, resource) in edges])
+
+
+class ReducePartitionedTest(unittest.TestCase):
+
+    def test_same_result_as_reduce_matrix_size(self):
+        for family in ('nested_loops', 'grid_cfg', 'random_dag'):
+            trans_matrix = exact_model(family, 60)
+            trans = reduce_partitioned(trans_matrix, parts=3, processes=2)
+            reduce_matrix_size(trans_matrix)
+            self.assertEqual(trans, trans_matrix.transition(0, 1))
+
+    def test_interior_vertices_of_regions_are_not_adjacent(self):
+        trans_matrix = exact_model('grid_cfg', 102)
+        (separator, regions) = partition(trans_matrix, 4)
+        self.assertEqual(separator[:2], [0, 1])
+        self.assertEqual(len(regions), 4)
+        region_of = dict((vertex, index)
+                         for (index, region) in enumerate(regions)
+                         for vertex in region)
+        for (row, column, _) in trans_matrix.iter_transitions():
+            if row in region_of and column in region_of:
+                self.assertEqual(region_of[row], region_of[column])
+
+    def test_order_has_to_be_strategy(self):
+        trans_matrix = TransitionMatrix(four_vertices_with_one_loop())
+        self.assertRaises(MatrixReduceError, reduce_partitioned,
+                          trans_matrix, order=[3, 2])
+
+
+class ReduceTopologicallyTest(unittest.TestCase):
+
+    def test_same_result_as_reduce_matrix_size(self):
+        for family in ('random_dag', 'grid_cfg', 'nested_loops'):
+            trans_matrix = exact_model(family, 40)
+            trans = reduce_topologically(trans_matrix)
+            reduce_matrix_size(trans_matrix)
+            self.assertEqual(trans, trans_matrix.transition(0, 1))
+
+    def test_loop_on_source(self):
+        trans_matrix = TransitionMatrix(five_vertices_with_four_loops())
+        trans = reduce_topologically(trans_matrix)
+        reduce_matrix_size(trans_matrix)
+        expected = trans_matrix.transition(0, 1)
+        self.assertEqual(trans.probability, expected.probability)
+        self.assertAlmostEqual(trans.resource, expected.resource)
+
+    def test_long_chain(self):
+        (size, edges) = benchmarks.chain(5000)
+        trans_matrix = SparseTransitionMatrix.from_edges(size, edges)
+        self.assertEqual(reduce_topologically(trans_matrix),
+                         Transition(1, 14995))
+
+    def test_ring_entered_at_every_vertex(self):
+        ring = list(range(2, 32))
+        edges = [(0, vertex, F(1, len(ring)), vertex) for vertex in ring]
+        for (vertex, column) in zip(ring, ring[1:] + ring[:1]):
+            edges.append((vertex, column, F(2, 3), 1))
+            edges.append((vertex, 1, F(1, 3), vertex % 5))
+        trans_matrix = SparseTransitionMatrix.from_edges(32, edges)
+        trans = reduce_topologically(trans_matrix)
+        reduce_matrix_size(trans_matrix)
+        self.assertEqual(trans, trans_matrix.transition(0, 1))
+
+    def test_drain_is_not_reachable(self):
+        trans_matrix = TransitionMatrix([
+            [_, _, (1, 3), _],
+            [_, _, _, _],
+            [_, _, _, (1, 2)],
+            [_, _, (1, 2), _],
+        ])
+        self.assertTrue(reduce_topologically(trans_matrix) is None)
+
+    def test_components_in_reverse_topological_order(self):
+        successors = [[(2, _)], [], [(3, _)], [(2, _), (1, _)]]
+        self.assertEqual(
+            [sorted(component) for component
+             in strongly_connected_components(successors, 0)],
+            [[1], [2, 3], [0]])
+
+
+class SimplifyTest(unittest.TestCase):
+
+    def test_same_result_as_reduce_matrix_size(self):
+        for family in ('chain', 'grid_cfg', 'nested_loops'):
+            trans_matrix = exact_model(family, 60)
+            reduce_matrix_size(trans_matrix)
+            simplified = exact_model(family, 60)
+            report = simplify(simplified)
+            self.assertTrue(report.vertices_after < report.vertices_before)
+            self.assertEqual(report.vertices_after, len(simplified))
+            reduce_matrix_size(simplified)
+            self.assertEqual(simplified.transition(0, 1),
+                             trans_matrix.transition(0, 1))
+
+    def test_vertices_off_paths_are_removed(self):
+        for matrix_class in (TransitionMatrix, SparseTransitionMatrix):
+            # Vertex 3 never leaves its loop and vertex 4 is unreachable.
+            trans_matrix = matrix_class([
+                [_, _, (D('0.5'), 2), (D('0.5'), 3), _],
+                [_, _, _, _, _],
+                [_, (1, 4), _, _, _],
+                [_, _, _, (1, 1), _],
+                [_, (1, 5), _, _, _],
+            ])
+            report = simplify(trans_matrix)
+            self.assertEqual(report, (5, 2, 5, 1, 2, 1))
+            self.assertEqual(trans_matrix.transition(0, 1),
+                             Transition(D('0.5'), 6))
+
+    def test_series_vertices_merge_with_parallel_transition(self):
+        trans_matrix = TransitionMatrix([
+            [_, (D('0.5'), 1), (D('0.5'), 2)],
+            [_, _, _],
+            [_, (1, 3), _],
+        ])
+        self.assertEqual(simplify(trans_matrix).collapsed, 1)
+        self.assertEqual(len(trans_matrix), 2)
+        self.assertEqual(trans_matrix.transition(0, 1), Transition(1, 3))
+
+
+class ReductionCacheTest(unittest.TestCase):
+
+    def test_hit_does_not_reduce_matrix(self):
+        cache = ReductionCache()
+        trans = cache.reduce(TransitionMatrix(four_vertices_with_one_loop()))
+        trans_matrix = TransitionMatrix(four_vertices_with_one_loop())
+        cached = cache.reduce(trans_matrix)
+        self.assertEqual(cached, trans)
+        self.assertEqual(len(trans_matrix), 4)
+        self.assertEqual(cache.statistics()[:4], (1, 1, 0, 1))
+
+        cached.probability = 0
+        self.assertEqual(cache.reduce(trans_matrix), trans)
+
+    def test_miss_does_not_change_matrix(self):
+        trans_matrix = TransitionMatrix(five_vertices_with_four_loops())
+        key = matrix_key(trans_matrix)
+        trans = ReductionCache().reduce(trans_matrix)
+        self.assertEqual(matrix_key(trans_matrix), key)
+        reduce_matrix_size(trans_matrix)
+        self.assertEqual(trans, trans_matrix.transition(0, 1))
+
+    def test_key_depends_on_contents_and_order(self):
+        trans_matrix = TransitionMatrix(four_vertices_with_one_loop())
+        key = matrix_key(trans_matrix)
+        self.assertEqual(
+            key, matrix_key(SparseTransitionMatrix(
+                four_vertices_with_one_loop())))
+        self.assertNotEqual(key, matrix_key(trans_matrix, MINIMUM_FILL))
+        trans_matrix.transition(2, 2).resource += 1
+        self.assertNotEqual(key, matrix_key(trans_matrix))
+
+    def test_least_recently_used_results_are_evicted(self):
+        models = [[[_, (1, resource)], [_, _]] for resource in range(3)]
+        cache = ReductionCache(max_entries=2)
+        for src_matrix in models + models[2:]:
+            cache.reduce(TransitionMatrix(src_matrix))
+        self.assertEqual(cache.statistics()[:4], (1, 3, 1, 2))
+        cache.reduce(TransitionMatrix(models[0]))
+        self.assertEqual(cache.statistics()[:4], (1, 4, 2, 2))
+
+        cache = ReductionCache(max_bytes=1)
+        cache.reduce(TransitionMatrix(models[0]))
+        self.assertEqual(len(cache), 0)
+
+    def test_threads_share_cache(self):
+        cache = ReductionCache()
+        results = []
+
+        def reduce_models():
+            for _ in range(20):
+                results.append(cache.reduce(
+                    TransitionMatrix(five_vertices_with_four_loops())))
+
+        threads = [threading.Thread(target=reduce_models) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(map(repr, results))), 1)
+        statistics = cache.statistics()
+        self.assertEqual(statistics.hits + statistics.misses, 80)
+        self.assertEqual(statistics.entries, 1)
+
+
+class SensitivitiesTest(unittest.TestCase):
+
+    def test_chain(self):
+        trans_matrix = TransitionMatrix([
+            [_, _, (F(1, 2), 3), (F(1, 2), 1)],
+            [_, _, _, _],
+            [_, (1, 4), _, _],
+            [_, _, _, _],
+        ])
+        sensitivity = sensitivities(trans_matrix)
+        self.assertEqual(sensitivity.transition, Transition(F(1, 2), 7))
+        self.assertEqual(sensitivity.probability[(0, 2)], (1, 0))
+        self.assertEqual(sensitivity.probability[(2, 1)], (F(1, 2), 0))
+        self.assertEqual(sensitivity.resource[(0, 2)], (0, 1))
+        self.assertEqual(sensitivity.resource[(0, 3)], (0, 0))
+        self.assertEqual(len(trans_matrix), 4)
+
+    def test_finite_differences(self):
+        src_matrix = [[_ if cell is None else tuple(map(float, cell))
+                       for cell in row]
+                      for row in five_vertices_with_four_loops()]
+        trans_matrix = TransitionMatrix(src_matrix, numeric=FLOAT)
+        sensitivity = sensitivities(trans_matrix, MINIMUM_FILL)
+        (size, edges, values) = split_matrix(trans_matrix)
+        plan = compile_plan(size, edges, MINIMUM_FILL)
+        step = 1e-6
+        for (edge_index, edge) in enumerate(edges):
+            for value_index in (0, 1):
+                shifted = []
+                for sign in (1, -1):
+                    new_values = [list(value) for value in values]
+                    new_values[edge_index][value_index] += sign * step
+                    shifted.append(plan.run(new_values))
+                self.assertAlmostEqual(
+                    sensitivity.probability[edge][value_index],
+                    (shifted[0].probability - shifted[1].probability) /
+                    (2 * step), places=5)
+                self.assertAlmostEqual(
+                    sensitivity.resource[edge][value_index],
+                    (shifted[0].resource - shifted[1].resource) / (2 * step),
+                    places=3)
+
+    def test_drain_is_not_reachable(self):
+        sensitivity = sensitivities(TransitionMatrix([
+            [_, _, (1, 3)],
+            [_, _, _],
+            [_, _, _],
+        ]))
+        self.assertTrue(sensitivity.transition is None)
+        self.assertEqual(sensitivity.probability, {(0, 2): (0, 0)})
+
+
+class SolveIterativelyTest(unittest.TestCase):
+
+    def float_model(self, family, size):
+        (size, edges) = benchmarks.FAMILIES[family](size, seed=1)
+        return SparseTransitionMatrix.from_edges(size, edges, numeric=FLOAT)
+
+    def test_same_result_as_reduce_matrix_size(self):
+        for family in ('nested_loops', 'random_dag', 'dense_random'):
+            trans_matrix = self.float_model(family, 60)
+            solution = solve_iteratively(trans_matrix, tolerance=1e-9)
+            self.assertTrue(solution.converged)
+            reduce_matrix_size(trans_matrix)
+            expected = trans_matrix.transition(0, 1)
+            self.assertAlmostEqual(solution.transition.probability,
+                                   expected.probability, places=8)
+            self.assertAlmostEqual(
+                solution.transition.resource / expected.resource, 1,
+                places=8)
+
+    def test_residual_of_equations(self):
+        trans_matrix = self.float_model('nested_loops', 100)
+        solution = solve_iteratively(trans_matrix, tolerance=1e-12)
+        self.assertTrue(solution.residual < 1e-12)
+        # Source has no loop and reaches drain with certainty, its equation
+        # is off by the error of its probability.
+        reach = list(solution.reach)
+        reach[0] += 1e-3
+        solution = solve_iteratively(
+            trans_matrix, max_iterations=0,
+            initial=solution._replace(reach=reach))
+        self.assertAlmostEqual(solution.residual, 1e-3)
+
+    def test_warm_start(self):
+        trans_matrix = self.float_model('nested_loops', 100)
+        solution = solve_iteratively(trans_matrix)
+        trans = trans_matrix.transition(50, 51)
+        trans.resource += 1
+        warm = solve_iteratively(trans_matrix, initial=solution)
+        cold = solve_iteratively(trans_matrix)
+        self.assertTrue(warm.iterations < cold.iterations)
+        self.assertAlmostEqual(warm.transition.resource,
+                               cold.transition.resource, places=6)
+
+    def test_iterations_are_limited(self):
+        trans_matrix = self.float_model('nested_loops', 100)
+        solution = solve_iteratively(trans_matrix, max_iterations=3)
+        self.assertFalse(solution.converged)
+        self.assertEqual(solution.iterations, 6)
+        self.assertTrue(solution.residual > 1e-6)
+        self.assertRaises(MatrixReduceError, solve_iteratively,
+                          TransitionMatrix(four_vertices_with_one_loop()),
+                          initial=solution)
+
+    def test_drain_is_not_reachable(self):
+        trans_matrix = TransitionMatrix([
+            [_, _, (1, 3)],
+            [_, _, _],
+            [_, _, (1, 2)],
+        ])
+        self.assertTrue(solve_iteratively(trans_matrix).transition is None)
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class EstimateTest(unittest.TestCase):
+
+    def test_intervals_contain_exact_result(self):
+        trans_matrix = TransitionMatrix(five_vertices_with_four_loops())
+        result = estimate(trans_matrix, samples=20000, seed=7)
+        self.assertEqual(result.samples, 20000)
+        self.assertEqual(result.truncated, 0)
+        reduce_matrix_size(trans_matrix)
+        expected = trans_matrix.transition(0, 1)
+        (low, high) = result.resource_interval
+        self.assertTrue(low < float(expected.resource) < high)
+        self.assertEqual(result.probability_interval, (1, 1))
+
+    def test_walks_which_do_not_reach_drain(self):
+        trans_matrix = TransitionMatrix([
+            [_, (D('0.25'), 4), (D('0.75'), 1)],
+            [_, _, _],
+            [_, _, _],
+        ])
+        result = estimate(trans_matrix, samples=4000, seed=1)
+        (low, high) = result.probability_interval
+        self.assertTrue(low < 0.25 < high)
+        self.assertEqual(result.resource_interval, (4, 4))
+
+    def test_hub_vertex(self):
+        # Source has many successors, the others have one each.
+        size = 1002
+        edges = [(0, vertex, F(1, size - 2), vertex % 10)
+                 for vertex in range(2, size)]
+        edges += [(vertex, 1, 1, 1) for vertex in range(2, size)]
+        trans_matrix = SparseTransitionMatrix.from_edges(size, edges)
+        (offsets, columns, _, _) = _compressed_rows(trans_matrix)
+        self.assertEqual(len(offsets), size + 1)
+        self.assertEqual(len(columns), len(edges) + 1)
+        result = estimate(trans_matrix, samples=20000, seed=5)
+        (low, high) = result.resource_interval
+        self.assertTrue(low < 5.5 < high)
+
+    def test_seed_and_budgets(self):
+        trans_matrix = TransitionMatrix(four_vertices_with_one_loop())
+        self.assertEqual(estimate(trans_matrix, samples=500, seed=3),
+                         estimate(trans_matrix, samples=500, seed=3))
+        result = estimate(trans_matrix, samples=10 ** 9, time_budget=0,
+                          batch_size=100)
+        self.assertEqual(result.samples, 100)
+        result = estimate(trans_matrix, samples=100, max_steps=1)
+        self.assertEqual(result.truncated, 100)
+        self.assertTrue(result.transition is None)
+
+
+class ReductionServiceTest(unittest.TestCase):
+
+    def exchange(self, service, lines):
+        async def run():
+            (host, port) = await service.start()
+            try:
+                (reader, writer) = await asyncio.open_connection(host, port)
+                writer.write(''.join(
+                    line + '\n' for line in lines).encode('utf-8'))
+                await writer.drain()
+                responses = [json.loads(await reader.readline())
+                             for _ in lines]
+                writer.close()
+            finally:
+                await service.close()
+            return dict((response['id'], response)
+                        for response in responses)
+        return asyncio.run(run())
+
+    def request(self, request_id, src_matrix):
+        edges = [[row, column, float(trans.probability),
+                  float(trans.resource)]
+                 for (row, column, trans)
+                 in TransitionMatrix(src_matrix).iter_transitions()]
+        return json.dumps({'id': request_id, 'size': len(src_matrix),
+                           'edges': edges})
+
+    def test_models_of_same_topology_are_grouped(self):
+        lines = [
+            self.request(1, four_vertices_with_one_loop()),
+            self.request(2, five_vertices_with_four_loops()),
+            self.request(3, four_vertices_with_one_loop()),
+            '{"id": 4, "size": 2, "edges": [[0, 1, 0.5, 1]]}',
+            'not json',
+        ]
+        responses = self.exchange(ReductionService(processes=1), lines)
+        for (request_id, src_matrix) in ((1, four_vertices_with_one_loop()),
+                                         (2, five_vertices_with_four_loops()),
+                                         (3, four_vertices_with_one_loop())):
+            trans_matrix = TransitionMatrix(src_matrix)
+            reduce_matrix_size(trans_matrix)
+            expected = trans_matrix.transition(0, 1)
+            self.assertAlmostEqual(responses[request_id]['probability'],
+                                   float(expected.probability))
+            self.assertAlmostEqual(responses[request_id]['resource'],
+                                   float(expected.resource))
+        self.assertTrue('error' in responses[4])
+        self.assertTrue('error' in responses[None])
+
+    def test_connection_is_not_read_while_requests_are_pending(self):
+        service = ReductionService(processes=1, max_pending=2)
+        submitted = []
+
+        def submit(size, edges):
+            submitted.append(size)
+            return asyncio.get_running_loop().create_future()
+
+        service._submit = submit
+
+        async def run():
+            (host, port) = await service.start()
+            try:
+                (_, writer) = await asyncio.open_connection(host, port)
+                writer.write(b''.join(
+                    self.request(index, [[_, (1, 7)], [_, _]]).encode(
+                        'utf-8') + b'\n' for index in range(500)))
+                await writer.drain()
+                await asyncio.sleep(0.2)
+                writer.close()
+                return len(submitted), len(asyncio.all_tasks())
+            finally:
+                await service.close()
+
+        (submitted_count, task_count) = asyncio.run(run())
+        self.assertEqual(submitted_count, 2)
+        self.assertTrue(task_count < 10)
+
+    def test_worker_failure_is_reported(self):
+        service = ReductionService(processes=1)
+
+        def flush(key, group):
+            for (_, future) in group:
+                future.set_exception(RuntimeError('worker died'))
+
+        service._flush = flush
+        responses = self.exchange(
+            service, [self.request(1, four_vertices_with_one_loop())])
+        self.assertEqual(responses[1]['error'], 'RuntimeError: worker died')
+
+    def test_line_longer_than_default_stream_limit(self):
+        (size, edges) = benchmarks.random_dag(3000, seed=1)
+        line = json.dumps({'id': 1, 'size': size, 'edges': edges})
+        self.assertTrue(len(line) > 2 ** 16)
+        responses = self.exchange(ReductionService(processes=1), [line])
+        trans_matrix = SparseTransitionMatrix.from_edges(
+            size, edges, numeric=FLOAT)
+        reduce_matrix_size(trans_matrix)
+        self.assertAlmostEqual(responses[1]['resource'],
+                               trans_matrix.transition(0, 1).resource)
+
+    def test_line_longer_than_limit_gets_error(self):
+        lines = [
+            self.request(1, five_vertices_with_four_loops()),
+            self.request(2, [[_, (1, 7)], [_, _]]),
+        ]
+        self.assertTrue(len(lines[0]) > 100 > len(lines[1]))
+        responses = self.exchange(ReductionService(processes=1, limit=100),
+                                  lines)
+        self.assertEqual(responses[None]['error'],
+                         'line is longer than 100 bytes')
+        self.assertEqual(responses[2]['resource'], 7)
+
+    def test_pool_is_replaced_when_worker_dies(self):
+        service = ReductionService(processes=1)
+        line = (self.request(1, [[_, (1, 7)], [_, _]]) + '\n').encode('utf-8')
+
+        async def run():
+            (host, port) = await service.start()
+            try:
+                (reader, writer) = await asyncio.open_connection(host, port)
+                writer.write(line)
+                first = json.loads(await reader.readline())
+                executor = service._executor
+                for process in list(executor._processes.values()):
+                    os.kill(process.pid, signal.SIGKILL)
+                for _ in range(100):
+                    if executor._broken:
+                        break
+                    await asyncio.sleep(0.05)
+                writer.write(line)
+                second = json.loads(await reader.readline())
+                writer.close()
+            finally:
+                await service.close()
+            return first, second
+
+        (first, second) = asyncio.run(run())
+        self.assertEqual(first['resource'], 7)
+        self.assertEqual(second['resource'], 7)
+
+    def test_timeout(self):
+        lines = [self.request('a', four_vertices_with_one_loop())]
+        responses = self.exchange(ReductionService(processes=1, timeout=0),
+                                  lines)
+        self.assertEqual(responses['a']['error'], 'timeout')
+
+
+class NumericModeTest(unittest.TestCase):
+
+    src_matrix = [
+        [_, _, (0.7, 1), (0.2, 2), (0.1, 3)],
+        [_, _, _, _, _],
+        [_, (1, 1), _, _, _],
+        [_, (0.5, 1), (0.5, 1), _, _],
+        [_, (0.9, 1), (0.1, 1), _, _],
+    ]
+
+    def test_float_rows_are_checked_with_tolerance(self):
+        self.assertRaises(MatrixInitError, TransitionMatrix, self.src_matrix)
+        trans_matrix = TransitionMatrix(self.src_matrix, numeric=FLOAT)
+        self.assertEqual(trans_matrix.numeric, FLOAT)
+        edges = [(0, 1, 0.7, 1), (0, 2, 0.2, 1), (0, 3, 0.1, 1),
+                 (2, 1, 1, 1), (3, 1, 1, 1)]
+        self.assertRaises(MatrixInitError,
+                          SparseTransitionMatrix.from_edges, 4, edges)
+        SparseTransitionMatrix.from_edges(4, edges, numeric=FLOAT)
+
+    def test_float_mode_does_not_hide_wrong_rows(self):
+        src_matrix = [[(0.6, 10), (0.39, 7)], [_, _]]
+        self.assertRaises(MatrixInitError, TransitionMatrix, src_matrix,
+                          numeric=FLOAT)
+        self.assertRaises(MatrixInitError, TransitionMatrix, src_matrix,
+                          numeric='double')
+
+    def test_float_reduction_is_close_to_exact(self):
+        exact = TransitionMatrix(five_vertices_with_four_loops())
+        reduce_matrix_size(exact)
+        expected = exact.transition(0, 1)
+        for trans_matrix in (
+                TransitionMatrix(five_vertices_with_four_loops(),
+                                 numeric=FLOAT),
+                SparseTransitionMatrix(five_vertices_with_four_loops(),
+                                       numeric=FLOAT)):
+            reduce_matrix_size(trans_matrix)
+            trans = trans_matrix.transition(0, 1)
+            self.assertTrue(isinstance(trans.probability, float))
+            self.assertAlmostEqual(trans.probability,
+                                   float(expected.probability))
+            self.assertAlmostEqual(trans.resource, float(expected.resource))
+
+    def test_exact_matrix_is_reduced_in_float_mode(self):
+        trans_matrix = TransitionMatrix(four_vertices_with_one_loop())
+        reduce_matrix_size(trans_matrix, numeric=FLOAT)
+        self.assertEqual(trans_matrix.numeric, FLOAT)
+        self.assertTrue(
+            isinstance(trans_matrix.transition(0, 1).resource, float))
+
+        trans_matrix = TransitionMatrix(self.src_matrix, numeric=FLOAT)
+        self.assertRaises(MatrixReduceError, reduce_matrix_size,
+                          trans_matrix, numeric=EXACT)
+
+
+class LoadEdgesTest(unittest.TestCase):
+
+    edges_csv = (
+        'src,dst,probability,resource\n'
+        '0,2,0.4,10\n'
+        '0,3,0.6,20\n'
+        '2,1,0.4,10\n'
+        '2,2,0.2,5\n'
+        '2,3,0.4,15\n'
+        '3,1,0.8,5\n'
+        '3,2,0.2,10\n'
+    )
+
+    def test_csv(self):
+        trans_matrix = load_edges(io.StringIO(self.edges_csv), format=CSV,
+                                  numeric=EXACT)
+        self.assertEqual(repr(trans_matrix),
+                         repr(TransitionMatrix(four_vertices_with_one_loop())))
+
+    def test_json_lines_from_file(self):
+        lines = [
+            '{"src": 0, "dst": 2, "probability": 0.4, "resource": 10}',
+            '{"src": 0, "dst": 3, "probability": 0.6, "resource": 20}',
+            '[2, 1, 0.4, 10]',
+            '[2, 2, 0.2, 5]',
+            '[2, 3, 0.4, 15]',
+            '',
+            '[3, 1, 0.8, 5]',
+            '[3, 2, 0.2, 10]',
+        ]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'model.jsonl')
+        with open(path, 'w') as edges_file:
+            edges_file.write('\n'.join(lines))
+
+        trans_matrix = load_edges(path, numeric=EXACT)
+        reduce_matrix_size(trans_matrix)
+        expected = TransitionMatrix(four_vertices_with_one_loop())
+        reduce_matrix_size(expected)
+        self.assertEqual(trans_matrix.transition(0, 1),
+                         expected.transition(0, 1))
+
+    def test_size_is_given(self):
+        trans_matrix = load_edges(io.StringIO('0,1,1,7\n'), size=3)
+        self.assertEqual(len(trans_matrix), 3)
+
+    def assertErrorAtLine(self, text, line_number, format=CSV):
+        try:
+            load_edges(io.StringIO(text), format=format, size=4)
+        except MatrixInitError as exc:
+            self.assertTrue(
+                exc.args[0].startswith('line {0}:'.format(line_number)), exc)
+        else:
+            self.fail('MatrixInitError is not raised')
+
+    def test_errors_report_line_numbers(self):
+        self.assertErrorAtLine('0,2,0.6,10\n0,3,0.39,7\n2,1,1,1\n', 1)
+        self.assertErrorAtLine('0,2,1,10\n2,1,1,1\n0,3,0.5,1\n', 3)
+        self.assertErrorAtLine('0,2,1,10\n2,1,abc,1\n', 2)
+        self.assertErrorAtLine('0,2,1,10\n2,7,1,1\n', 2)
+        self.assertErrorAtLine('0,2,1,10\n2,1\n', 2)
+        self.assertErrorAtLine('[0, 1, 1, 7]\n{"src": 2}\n', 2, JSON_LINES)
+        self.assertErrorAtLine('[0, 1, 1.0, 2.0]\n5\n', 2, JSON_LINES)
+        self.assertErrorAtLine('[0, 1, 1.0, 2.0]\nnull\n', 2, JSON_LINES)
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class StorageTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'model.bzr')
+
+    def test_save_and_load(self):
+        trans_matrix = SparseTransitionMatrix(five_vertices_with_four_loops())
+        storage.save(trans_matrix, self.path)
+        for mmap in (True, False):
+            loaded = storage.load(self.path, mmap=mmap)
+            self.assertEqual(repr(loaded), repr(DenseTransitionMatrix(
+                five_vertices_with_four_loops())))
+
+    def test_reduction_does_not_change_file(self):
+        storage.save(TransitionMatrix(four_vertices_with_one_loop()),
+                     self.path)
+        reduce_matrix_size(storage.load(self.path))
+        self.assertEqual(len(storage.load(self.path)), 4)
+
+    def test_resume_from_checkpoint(self):
+        expected = DenseTransitionMatrix(five_vertices_with_four_loops())
+        reduce_matrix_size(expected)
+
+        trans_matrix = DenseTransitionMatrix(five_vertices_with_four_loops())
+        while trans_matrix.loop_exists():
+            trans_matrix.exclude_first_loop()
+        trans_matrix.exclude_last_vertex()
+        storage.save(trans_matrix, self.path)
+
+        resumed = storage.load(self.path)
+        self.assertEqual(len(resumed), 4)
+        storage.reduce_with_checkpoints(resumed, self.path)
+        self.assertEqual(repr(resumed), repr(expected))
+        self.assertEqual(repr(storage.load(self.path)), repr(expected))
+
+    def test_wrong_file(self):
+        with open(self.path, 'wb') as matrix_file:
+            matrix_file.write(b'x' * 100)
+        self.assertRaises(MatrixInitError, storage.load, self.path)
+
+
+class BenchmarksTest(unittest.TestCase):
+
+    def test_generated_models_are_valid(self):
+        for (family, generate) in benchmarks.FAMILIES.items():
+            for size in (3, 10, 37):
+                (size, edges) = generate(size, seed=1)
+                trans_matrix = SparseTransitionMatrix.from_edges(size, edges)
+                reduce_matrix_size(trans_matrix)
+                self.assertAlmostEqual(
+                    trans_matrix.transition(0, 1).probability, 1, msg=family)
+
+    def test_run_benchmarks(self):
+        records = benchmarks.run_benchmarks(
+            families=['chain_with_loops', 'dense_random'], sizes=[10, 400],
+            backends=['sparse', 'list'])
+        self.assertEqual(len(records), 6)
+        for record in records:
+            self.assertTrue(record['reduce_seconds'] >= 0)
+            self.assertTrue(record['peak_memory_bytes'] > 0)
+            self.assertAlmostEqual(record['probability'], 1)
+
+
+class ReductionObserverTest(unittest.TestCase):
+
+    def test_statistics(self):
+        statistics = ReductionStatistics(keep_events=True)
+        trans_matrix = TransitionMatrix(five_vertices_with_four_loops())
+        created = reduce_matrix_size(trans_matrix, observer=statistics)
+
+        self.assertEqual(statistics.vertices_excluded, 3)
+        self.assertEqual(statistics.transitions_created, created)
+        self.assertEqual(
+            [(event.kind, event.vertex) for event in statistics.events],
+            [(LOOP, 0), (LOOP, 2), (LOOP, 3), (LOOP, 4),
+             (VERTEX, 4), (VERTEX, 3), (VERTEX, 2)])
+        summary = statistics.summary()
+        self.assertEqual(summary['loops_excluded'], 4)
+        self.assertTrue(summary['cells_touched'] > 0)
+        self.assertTrue(summary['vertex_seconds'] >= 0)
+
+    def test_vertices_are_reported_with_original_indices(self):
+        events = []
+        trans_matrix = SparseTransitionMatrix([
+            [_, _, (D('1'), D('1')), _],
+            [_, _, _, _],
+            [_, _, _, (D('1'), D('2'))],
+            [_, (D('0.5'), D('3')), (D('0.5'), D('4')), _],
+        ])
+        reduce_matrix_size(trans_matrix, order=[2, 3],
+                           observer=events.append)
+        # Excluding vertex 2 creates a loop on vertex 3 which is the third
+        # one in the matrix by then.
+        self.assertEqual(
+            [(event.kind, event.vertex, event.created) for event in events],
+            [(VERTEX, 2, 2), (LOOP, 3, 0), (VERTEX, 3, 1)])
+
 if __name__ == '__main__':
     unittest.main()